@@ -23,9 +23,14 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-hctr(z4xm^ncn=rxfnni_hem@qhcxg!c6ynre%&*z!a&bso8!1'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# Off unless DEBUG=1, docker-compose turns it on for development
+DEBUG = bool(int(os.environ.get('DEBUG', 0)))
 
-ALLOWED_HOSTS = []
+# Comma separated host names served, localhost is allowed while DEBUG is on
+ALLOWED_HOSTS = [
+    host for host in os.environ.get('ALLOWED_HOSTS', '').split(',')
+    if host
+]
 
 
 # Application definition
@@ -37,6 +42,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core',
     'rest_framework',
     'rest_framework.authtoken',
@@ -47,6 +53,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -79,16 +86,78 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# DB_PGBOUNCER=1 when connecting through pgbouncer in transaction pooling
+# mode, where a cursor can't outlive its transaction
+DB_PGBOUNCER = bool(int(os.environ.get('DB_PGBOUNCER', 0)))
+DB_CONN_MAX_AGE = os.environ.get('DB_CONN_MAX_AGE', '60')
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # Postgres with CONN_HEALTH_CHECKS backported from Django 4.1
+        'ENGINE': 'core.backends.postgresql',
         'HOST': os.environ.get('DB_HOST'),
+        'PORT': os.environ.get('DB_PORT', ''),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        # Seconds a connection is reused across requests, 0 closes it
+        # after every request & None never does. Each wsgi worker thread
+        # holds one, so the connections in use are workers x threads. An
+        # asgi worker holds one, its sync code all runs on one thread.
+        'CONN_MAX_AGE': (
+            None if DB_CONN_MAX_AGE == 'none' else int(DB_CONN_MAX_AGE)),
+        # Test a reused connection before the first query of a request
+        'CONN_HEALTH_CHECKS': bool(
+            int(os.environ.get('DB_CONN_HEALTH_CHECKS', 1))),
+        'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER,
     }
 }
 
+# Read replicas of the primary as comma separated host[:port] entries,
+# safe-method requests read from them through core.routers
+DB_REPLICA_HOSTS = [
+    host for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',')
+    if host
+]
+for number, replica_host in enumerate(DB_REPLICA_HOSTS, 1):
+    host, _, port = replica_host.partition(':')
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        # Tests read the primary's test database through the replicas
+        'TEST': {'MIRROR': 'default'},
+    }
+DB_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+
+# Seconds a user's reads stay on the primary after their last write, so
+# they see it while the replicas catch up
+DB_PRIMARY_STICKY_SECONDS = int(
+    os.environ.get('DB_PRIMARY_STICKY_SECONDS', 10))
+DB_ROUTING_CACHE_ALIAS = 'default'
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+# LocMemCache is per process, fine for runserver & tests. Deployments run
+# several processes that share response versions, token invalidations &
+# primary pinning through it, so check --deploy requires a shared backend
+# such as django.core.cache.backends.memcached.PyMemcacheCache.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+RECIPE_RESPONSE_CACHE_ALIAS = 'default'
+RECIPE_RESPONSE_CACHE_TIMEOUT = int(
+    os.environ.get('RECIPE_RESPONSE_CACHE_TIMEOUT', 300))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -132,6 +201,10 @@ MEDIA_URL = '/static/media/'
 STATIC_ROOT = '/vol/web/static'
 MEDIA_ROOT = '/vol/web/media'
 
+# Internal nginx location aliased to MEDIA_ROOT, media is then sent by
+# the proxy through X-Accel-Redirect instead of by Django
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -143,6 +216,40 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS':'drf_spectacular.openapi.AutoSchema',
 }
 
+# Token -> user lookups cached per process, backed by a shared cache alias
+# from CACHES, empty for none
+TOKEN_AUTH_CACHE_TTL = int(os.environ.get('TOKEN_AUTH_CACHE_TTL', 60))
+TOKEN_AUTH_CACHE_MAX_SIZE = int(
+    os.environ.get('TOKEN_AUTH_CACHE_MAX_SIZE', 10000))
+TOKEN_AUTH_CACHE_ALIAS = os.environ.get(
+    'TOKEN_AUTH_CACHE_ALIAS', 'default') or None
+# Without a shared alias, other processes only notice logout, rotation &
+# deactivation when their copy expires, after at most this many seconds
+TOKEN_AUTH_CACHE_LOCAL_TTL = int(
+    os.environ.get('TOKEN_AUTH_CACHE_LOCAL_TTL', 5))
+
+# Largest image accepted by chunked uploads, in bytes
+IMAGE_UPLOAD_MAX_SIZE = int(
+    os.environ.get('IMAGE_UPLOAD_MAX_SIZE', 20 * 1024 * 1024))
+# Hours a chunked upload may take, gc_images deletes older unfinished ones
+CHUNKED_UPLOAD_EXPIRY_HOURS = int(
+    os.environ.get('CHUNKED_UPLOAD_EXPIRY_HOURS', 24))
+
+# Most recipes accepted by one bulk create, update or delete request
+RECIPE_BULK_MAX_ITEMS = int(os.environ.get('RECIPE_BULK_MAX_ITEMS', 1000))
+
+# Deleted objects are reported to delta sync clients for this long
+SYNC_TOMBSTONE_RETENTION_DAYS = int(
+    os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+# Seconds sync tokens lag the clock, longer than any write transaction
+# (e.g. an import batch) so rows it stamped before committing are sent
+SYNC_TOKEN_LAG_SECONDS = int(os.environ.get('SYNC_TOKEN_LAG_SECONDS', 60))
+# Most recipes, tags & ingredients each in one page of a full sync
+SYNC_PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE', 500))
+
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True,
-}
\ No newline at end of file
+}
+
+# Written by the generate_schema command & served at /api/schema/
+API_SCHEMA_DIR = os.environ.get('API_SCHEMA_DIR', '/vol/web/schema')
\ No newline at end of file
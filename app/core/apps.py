@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Connect the auth token cache & image reference signals &
+        # register the system checks
+        from core import authentication, blobs, checks  # noqa: F401
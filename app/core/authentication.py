@@ -0,0 +1,194 @@
+# Token authentication with a cached token -> user lookup
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from core.routers import (
+    pin_primary,
+    primary,
+    primary_pinned,
+    user_wrote_recently,
+)
+
+
+class TokenCache:
+    # Process-local LRU of token key -> user with a TTL & generation per
+    # entry, an entry of another generation is stale
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, generation=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, entry_generation, expires_at = entry
+            if expires_at < time.monotonic() \
+                    or entry_generation != generation:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user
+
+    def set(self, key, user, generation=None, ttl=None):
+        if ttl is None:
+            ttl = settings.TOKEN_AUTH_CACHE_TTL
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            self._entries[key] = (user, generation, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.TOKEN_AUTH_CACHE_MAX_SIZE:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+def _shared_cache():
+    # Optional cache shared between processes
+    alias = settings.TOKEN_AUTH_CACHE_ALIAS
+    return caches[alias] if alias else None
+
+
+def _shared_key(key):
+    return f'auth-token:{key}'
+
+
+def _generation_key(key):
+    return f'auth-token-generation:{key}'
+
+
+def _shared_user(user):
+    # What the shared cache keeps of a user, every field but the password
+    # hash, so it never leaves the database
+    return {
+        field.attname: getattr(user, field.attname)
+        for field in user._meta.concrete_fields
+        if field.name != 'password'
+    }
+
+
+def _user_from_shared(values):
+    # User with the password deferred, loaded from the database when
+    # accessed. save() then only writes the loaded fields.
+    return get_user_model().from_db(
+        DEFAULT_DB_ALIAS, list(values), list(values.values()))
+
+
+def _generation(shared, key):
+    # Current generation of a token, bumped on every invalidation so the
+    # local caches of all processes drop their copy
+    generation = shared.get(_generation_key(key))
+    if generation is None:
+        # Start from the clock, so an evicted counter never repeats an
+        # older generation
+        shared.add(_generation_key(key), time.time_ns(), None)
+        generation = shared.get(_generation_key(key))
+    return generation
+
+
+def invalidate_token(key):
+    # Drop a token from the local & shared caches, other processes see
+    # the new generation on their next local hit
+    token_cache.delete(key)
+    shared = _shared_cache()
+    if shared is not None:
+        try:
+            shared.incr(_generation_key(key))
+        except ValueError:
+            shared.add(_generation_key(key), time.time_ns(), None)
+        shared.delete(_shared_key(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    # Drop-in TokenAuthentication that skips the token/user query on hits
+
+    def _lookup(self, key):
+        try:
+            user, _ = super().authenticate_credentials(key)
+        except exceptions.AuthenticationFailed:
+            if primary_pinned():
+                raise
+            # A token created moments ago may not be on the replica yet
+            with primary():
+                user, _ = super().authenticate_credentials(key)
+        return user
+
+    def authenticate_credentials(self, key):
+        shared = _shared_cache()
+        if shared is None:
+            # Nothing tells this process about invalidations elsewhere,
+            # so its copies expire quickly
+            generation = None
+            ttl = min(
+                settings.TOKEN_AUTH_CACHE_TTL,
+                settings.TOKEN_AUTH_CACHE_LOCAL_TTL)
+        else:
+            generation = _generation(shared, key)
+            ttl = settings.TOKEN_AUTH_CACHE_TTL
+
+        user = token_cache.get(key, generation)
+        if user is None:
+            if shared is not None:
+                entry = shared.get(_shared_key(key))
+                if entry is not None and entry[0] == generation:
+                    user = _user_from_shared(entry[1])
+            if user is None:
+                user = self._lookup(key)
+                if shared is not None:
+                    shared.set(
+                        _shared_key(key),
+                        (generation, _shared_user(user)),
+                        settings.TOKEN_AUTH_CACHE_TTL)
+            token_cache.set(key, user, generation, ttl)
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+
+        # Reads after the user's own recent writes must see them
+        if not primary_pinned() and user_wrote_recently(user.pk):
+            pin_primary()
+
+        # Each request gets its own copy so changes don't leak between them
+        user = copy.deepcopy(user)
+        return (user, Token(key=key, user=user))
+
+
+@receiver(post_delete, sender=Token)
+@receiver(post_save, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    # Logout & token rotation
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_cached_user_tokens(sender, instance, **kwargs):
+    # Deactivation or any other change to the cached user, deleting
+    # a user cascades to its token & is handled above
+    for key in Token.objects.filter(
+            user_id=instance.pk).values_list('key', flat=True):
+        invalidate_token(key)
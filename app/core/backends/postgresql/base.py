@@ -0,0 +1,36 @@
+# Postgres backend checking persistent connections before reuse
+from django.db.backends.postgresql import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # Backport of CONN_HEALTH_CHECKS from Django 4.1: a connection kept
+    # open by CONN_MAX_AGE is tested once per request, before its first
+    # query, & replaced if the server went away meanwhile
+
+    health_check_enabled = False
+    health_check_done = False
+
+    def connect(self):
+        super().connect()
+        self.health_check_enabled = self.settings_dict.get(
+            'CONN_HEALTH_CHECKS', False)
+        self.health_check_done = True
+
+    def close_if_health_check_failed(self):
+        if (
+                self.connection is None
+                or not self.health_check_enabled
+                or self.health_check_done):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
+
+    def close_if_unusable_or_obsolete(self):
+        # Runs at the start & end of every request
+        self.health_check_done = False
+        super().close_if_unusable_or_obsolete()
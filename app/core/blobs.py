@@ -0,0 +1,60 @@
+# Content addressed image storage with reference counting
+import hashlib
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from core.images import IMAGE_EXTENSION, save_variants
+from core.models import ImageBlob, Recipe, image_blob_file_path
+
+
+def store_image(instance, variants):
+    # Point a recipe or user at the blob of the variants, writing the
+    # files only for content not stored yet
+    digest = hashlib.sha256(variants['original']).hexdigest()
+    name = image_blob_file_path(digest, IMAGE_EXTENSION)
+
+    with transaction.atomic():
+        # Target first, then blob: concurrent jobs for one target take
+        # turns & each releases the image the previous one stored
+        previous = type(instance).objects.select_for_update().values_list(
+            'image', flat=True).get(pk=instance.pk)
+        if previous == name:
+            # Same content again, the target already holds its reference
+            instance.image.name = name
+            return
+
+        # Row lock so only one worker writes the files of a blob & the
+        # gc_images command can't delete them meanwhile
+        blob, _ = ImageBlob.objects.select_for_update().get_or_create(
+            digest=digest,
+            defaults={'name': name},
+        )
+        if not default_storage.exists(name):
+            save_variants(default_storage, name, variants)
+        blob.ref_count = F('ref_count') + 1
+        blob.save(update_fields=['ref_count'])
+
+        instance.image.name = name
+        update_fields = ['image']
+        if isinstance(instance, Recipe):
+            update_fields.append('updated_at')
+        instance.save(update_fields=update_fields)
+        if previous:
+            release_image(previous)
+
+
+def release_image(name):
+    # Drop one reference, files are removed by the gc_images command
+    ImageBlob.objects.filter(name=name).update(ref_count=F('ref_count') - 1)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=get_user_model())
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        release_image(instance.image.name)
@@ -0,0 +1,51 @@
+# System checks run by every management command, so startup fails early
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+from PIL import features
+
+from core.images import IMAGE_FORMAT
+
+
+# Caches holding state every process must agree on
+SHARED_CACHE_SETTINGS = [
+    'RECIPE_RESPONSE_CACHE_ALIAS',
+    'TOKEN_AUTH_CACHE_ALIAS',
+    'DB_ROUTING_CACHE_ALIAS',
+]
+PROCESS_LOCAL_CACHES = [
+    'django.core.cache.backends.locmem.LocMemCache',
+]
+
+
+@register()
+def check_image_encoder(app_configs, **kwargs):
+    # Pillow built without libwebp can't write any image variant
+    if features.check(IMAGE_FORMAT.lower()):
+        return []
+    return [Error(
+        f'Pillow was built without {IMAGE_FORMAT} support.',
+        hint='Install libwebp (libwebp-dev to build) & reinstall Pillow.',
+        id='core.E001',
+    )]
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    # Deployments run several workers & the image worker, each with its
+    # own LocMemCache, so a write in one would go unnoticed by the others
+    errors = []
+    for name in SHARED_CACHE_SETTINGS:
+        alias = getattr(settings, name)
+        if alias is None:
+            backend = None
+        else:
+            backend = settings.CACHES[alias]['BACKEND']
+        if backend is None or backend in PROCESS_LOCAL_CACHES:
+            errors.append(Error(
+                f'{name} must name a cache shared between processes.',
+                hint=(
+                    'Set CACHE_BACKEND & CACHE_LOCATION to a shared cache, '
+                    'e.g. memcached.'),
+                id='core.E002',
+            ))
+    return errors
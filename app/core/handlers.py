@@ -0,0 +1,53 @@
+# ASGI handler producing streamed response parts off the event loop
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+
+
+_END = object()
+
+
+def _next_part(parts):
+    return next(parts, _END)
+
+
+class StreamingASGIHandler(ASGIHandler):
+    # Django 3.2 iterates streaming responses on the event loop, where
+    # file reads block every other request & the ORM calls of a streamed
+    # export raise SynchronousOnlyOperation. Each part is produced in the
+    # request's thread instead & sent without holding it.
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        response_headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            response_headers.append((bytes(header), bytes(value)))
+        for c in response.cookies.values():
+            response_headers.append(
+                (b'Set-Cookie', c.output(header='').encode('ascii').strip())
+            )
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': response_headers,
+        })
+
+        parts = await sync_to_async(iter, thread_sensitive=True)(response)
+        next_part = sync_to_async(_next_part, thread_sensitive=True)
+        while True:
+            part = await next_part(parts)
+            if part is _END:
+                break
+            for chunk, _ in self.chunk_bytes(part):
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
@@ -0,0 +1,122 @@
+# Resize & recompress uploaded images into size variants
+import io
+import os
+
+from PIL import Image, ImageOps
+
+from django.core.files.base import ContentFile
+
+from rest_framework import serializers
+
+
+IMAGE_FORMAT = 'WEBP'
+IMAGE_EXTENSION = '.webp'
+IMAGE_QUALITY = 80
+MAX_DIMENSION = 8000
+MAX_PIXELS = 40_000_000
+
+# Longest side of each variant, the original is only capped
+VARIANT_SIZES = {
+    'thumbnail': 256,
+    'medium': 1024,
+    'original': 2048,
+}
+
+
+class ImageProcessingError(ValueError):
+    pass
+
+
+def _encode(image, size):
+    image = image.copy()
+    image.thumbnail((size, size), Image.LANCZOS)
+    buffer = io.BytesIO()
+    # Saved without the exif argument, so metadata is dropped
+    image.save(buffer, format=IMAGE_FORMAT, quality=IMAGE_QUALITY)
+    return buffer.getvalue()
+
+
+def open_image(image_file):
+    # Open an upload & check its size from the header alone
+    try:
+        image_file.seek(0)
+        image = Image.open(image_file)
+    except (OSError, Image.DecompressionBombError) as exc:
+        raise ImageProcessingError('Upload a valid image.') from exc
+
+    width, height = image.size
+    if max(width, height) > MAX_DIMENSION or width * height > MAX_PIXELS:
+        raise ImageProcessingError(
+            f'Image must be at most {MAX_DIMENSION}px per side.')
+    return image
+
+
+def process_image(image_file):
+    # Validate an upload & return the encoded bytes of every variant
+    image = open_image(image_file)
+    try:
+        image = ImageOps.exif_transpose(image)
+    except OSError as exc:
+        raise ImageProcessingError('Upload a valid image.') from exc
+    if image.mode not in ('RGB', 'RGBA'):
+        has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    return {
+        variant: _encode(image, size)
+        for variant, size in VARIANT_SIZES.items()
+    }
+
+
+def variant_name(name, variant):
+    # Storage name of a variant next to the original image
+    if variant == 'original':
+        return name
+    root, ext = os.path.splitext(name)
+    return f'{root}_{variant}{ext}'
+
+
+def original_name(name):
+    # Storage name of the original a variant belongs to
+    root, ext = os.path.splitext(name)
+    for variant in VARIANT_SIZES:
+        suffix = f'_{variant}'
+        if variant != 'original' and root.endswith(suffix):
+            return f'{root[:-len(suffix)]}{ext}'
+    return name
+
+
+def save_variants(storage, name, variants):
+    # Write every variant under the original's storage name
+    for variant, content in variants.items():
+        storage.save(variant_name(name, variant), ContentFile(content))
+
+
+def delete_variants(field_file):
+    if not field_file:
+        return
+    for variant in VARIANT_SIZES:
+        if variant != 'original':
+            field_file.storage.delete(variant_name(field_file.name, variant))
+
+
+def variant_urls(field_file):
+    # URL of every variant of an image, None without an image
+    if not field_file:
+        return None
+    return {
+        variant: field_file.storage.url(variant_name(field_file.name, variant))
+        for variant in VARIANT_SIZES
+    }
+
+
+class ImageUploadMixin:
+    # Model serializer mixin validating an `image` before it is queued
+
+    def validate_image(self, image):
+        try:
+            open_image(image)
+        except ImageProcessingError as exc:
+            raise serializers.ValidationError(str(exc))
+        image.seek(0)
+        return image
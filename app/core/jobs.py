@@ -0,0 +1,101 @@
+# Database backed queue for image processing jobs
+import logging
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.blobs import store_image
+from core.images import ImageProcessingError, process_image
+from core.models import ImageJob, Recipe
+
+
+logger = logging.getLogger(__name__)
+
+# Running jobs not finished within this time are claimed again, until
+# they have been tried MAX_ATTEMPTS times
+CLAIM_TIMEOUT = timedelta(minutes=10)
+MAX_ATTEMPTS = 3
+
+
+def image_target(instance):
+    return ImageJob.RECIPE if isinstance(instance, Recipe) else ImageJob.USER
+
+
+def enqueue_image_job(user, instance, image_file):
+    # Persist the raw upload & queue it for a worker
+    return ImageJob.objects.create(
+        user=user,
+        target=image_target(instance),
+        object_id=instance.pk,
+        source=image_file,
+    )
+
+
+def _fail_abandoned_jobs(stale):
+    # Jobs whose worker died on every attempt would stay running forever
+    with transaction.atomic():
+        jobs = ImageJob.objects.select_for_update(skip_locked=True).filter(
+            status=ImageJob.RUNNING,
+            claimed_at__lt=stale,
+            attempts__gte=MAX_ATTEMPTS)
+        for job in jobs:
+            job.status = ImageJob.FAILED
+            job.error = f'Abandoned after {job.attempts} attempts.'
+            job.source.delete(save=False)
+            job.save(update_fields=['status', 'error', 'source'])
+
+
+def claim_next_job():
+    # Lock & mark the oldest waiting job as running, skipping rows
+    # another worker holds
+    stale = timezone.now() - CLAIM_TIMEOUT
+    _fail_abandoned_jobs(stale)
+    with transaction.atomic():
+        job = ImageJob.objects.select_for_update(skip_locked=True).filter(
+            Q(status=ImageJob.PENDING)
+            | Q(
+                status=ImageJob.RUNNING,
+                claimed_at__lt=stale,
+                attempts__lt=MAX_ATTEMPTS)
+        ).order_by('id').first()
+        if job is None:
+            return None
+        job.status = ImageJob.RUNNING
+        job.claimed_at = timezone.now()
+        job.attempts += 1
+        job.save(update_fields=['status', 'claimed_at', 'attempts'])
+    return job
+
+
+def _target(job):
+    model = Recipe if job.target == ImageJob.RECIPE else get_user_model()
+    return model.objects.get(pk=job.object_id)
+
+
+def run_job(job):
+    # Process the upload & store the variants on the target
+    try:
+        with job.source.open('rb') as source:
+            variants = process_image(source)
+        store_image(_target(job), variants)
+    except (
+            ImageProcessingError,
+            ObjectDoesNotExist,
+            FileNotFoundError) as exc:
+        job.status = ImageJob.FAILED
+        job.error = str(exc)
+    except Exception:
+        # Anything else fails this job only, not the worker. The details
+        # go to the worker's log, not to the user.
+        logger.exception('Image job %s failed', job.pk)
+        job.status = ImageJob.FAILED
+        job.error = 'Image processing failed.'
+    else:
+        job.status = ImageJob.DONE
+    job.source.delete(save=False)
+    job.save(update_fields=['status', 'error', 'source'])
+    return job
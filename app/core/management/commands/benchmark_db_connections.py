@@ -0,0 +1,59 @@
+"""
+Django command to measure the per-request cost of opening database
+connections against reusing them
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Simulated requests per run',
+        )
+        parser.add_argument('--database', default='default')
+
+    def _run(self, connection, requests, max_age, health_checks):
+        # Each simulated request runs one query between the connection
+        # handling Django does on request_started & request_finished
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+        connection.settings_dict['CONN_HEALTH_CHECKS'] = health_checks
+        started = time.perf_counter()
+        for _ in range(requests):
+            close_old_connections()
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            close_old_connections()
+        elapsed = time.perf_counter() - started
+        connection.close()
+        return elapsed / requests * 1000
+
+    def handle(self, *args, **options):
+        # Entry point for command
+        connection = connections[options['database']]
+        original = {
+            key: connection.settings_dict.get(key)
+            for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')
+        }
+        requests = options['requests']
+        try:
+            fresh = self._run(connection, requests, 0, False)
+            persistent = self._run(connection, requests, None, False)
+            checked = self._run(connection, requests, None, True)
+        finally:
+            connection.settings_dict.update(original)
+
+        self.stdout.write(f'New connection per request: {fresh:.3f} ms')
+        self.stdout.write(f'Persistent connection: {persistent:.3f} ms')
+        self.stdout.write(
+            f'Persistent connection with health checks: {checked:.3f} ms')
+        self.stdout.write(self.style.SUCCESS(
+            f'Saved per request: {fresh - checked:.3f} ms'
+        ))
@@ -0,0 +1,66 @@
+"""
+Django command to merge duplicate tags & ingredients of a user
+"""
+from django.db import transaction
+from django.db.models import Count, Min
+from django.core.management.base import BaseCommand
+
+from core.models import Recipe, Tag, Ingredient
+
+
+def merge_duplicates(model, through, field_name):
+    # Keep the oldest row per (user, name) & move recipe links onto it
+    duplicates = model.objects.values('user', 'name').annotate(
+        keep_id=Min('id'),
+        total=Count('id'),
+    ).filter(total__gt=1)
+
+    merged = 0
+    for duplicate in duplicates.iterator():
+        keep_id = duplicate['keep_id']
+        extra_ids = list(model.objects.filter(
+            user=duplicate['user'],
+            name=duplicate['name'],
+        ).exclude(id=keep_id).values_list('id', flat=True))
+
+        linked = set(through.objects.filter(
+            **{f'{field_name}_id__in': extra_ids}
+        ).values_list('recipe_id', flat=True))
+        linked -= set(through.objects.filter(
+            **{f'{field_name}_id': keep_id}
+        ).values_list('recipe_id', flat=True))
+        through.objects.bulk_create([
+            through(recipe_id=recipe_id, **{f'{field_name}_id': keep_id})
+            for recipe_id in linked
+        ])
+
+        model.objects.filter(id__in=extra_ids).delete()
+        merged += len(extra_ids)
+
+    return merged
+
+
+def merge_all_duplicates(recipe_model, tag_model, ingredient_model):
+    # Merge duplicate tags & ingredients, return how many were removed
+    return (
+        merge_duplicates(
+            tag_model,
+            recipe_model._meta.get_field('tags').remote_field.through,
+            'tag'),
+        merge_duplicates(
+            ingredient_model,
+            recipe_model._meta.get_field('ingredients').remote_field.through,
+            'ingredient'),
+    )
+
+
+class Command(BaseCommand):
+
+    def handle(self, *args, **options):
+        # Entry point for command
+        with transaction.atomic():
+            tags, ingredients = merge_all_duplicates(Recipe, Tag, Ingredient)
+        self.stdout.write(self.style.SUCCESS(
+            f'Merged {tags} duplicate tags & '
+            f'{ingredients} duplicate ingredients'
+        ))
@@ -0,0 +1,48 @@
+"""
+Django command to export a user's recipes as NDJSON or CSV
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe.backup import CHUNK_SIZE, CONTENT_TYPES, export_recipes
+
+
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Owner of the recipes')
+        parser.add_argument(
+            '--file-format',
+            choices=list(CONTENT_TYPES),
+            default='ndjson',
+        )
+        parser.add_argument(
+            '--output',
+            help='File to write, standard output by default',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='Recipes read per database round trip',
+        )
+
+    def handle(self, *args, **options):
+        # Entry point for command
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No user {options["email"]}')
+
+        pieces = export_recipes(
+            user,
+            options['file_format'],
+            options['chunk_size'])
+        if not options['output']:
+            for piece in pieces:
+                self.stdout.write(piece, ending='')
+            return
+
+        with open(options['output'], 'w', newline='') as output:
+            for piece in pieces:
+                output.write(piece)
@@ -0,0 +1,157 @@
+"""
+Django command to delete image files no longer referenced & uploads
+never finished
+"""
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.images import VARIANT_SIZES, original_name, variant_name
+from core.models import ChunkedUpload, ImageBlob, ImageJob, Recipe
+from core.uploads import CLAIM_TIMEOUT
+
+
+UPLOAD_DIRS = [
+    os.path.join('uploads', 'images'),
+    os.path.join('uploads', 'recipe'),
+    os.path.join('uploads', 'user'),
+    os.path.join('uploads', 'pending'),
+]
+
+
+def _referenced(names):
+    # Names of the batch still used by a recipe, user, job or upload
+    referenced = set()
+    for model, field in [
+            (Recipe, 'image'),
+            (get_user_model(), 'image'),
+            (ImageJob, 'source'),
+            (ChunkedUpload, 'file'),
+            (ImageBlob, 'name')]:
+        referenced.update(model.objects.filter(
+            **{f'{field}__in': names}
+        ).values_list(field, flat=True))
+    return referenced
+
+
+def _walk(directory):
+    # Yield storage names of files below a directory of MEDIA_ROOT
+    root = default_storage.path(directory)
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            yield os.path.relpath(path, default_storage.location), path
+
+
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Files checked per query',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=3600,
+            help='Seconds a file must be untouched before it is deleted',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report what would be deleted',
+        )
+
+    def _delete_expired_uploads(self, dry_run):
+        # Delete uploads older than the expiry, with their file if never
+        # finished (a finished one's file belongs to its job). Skips an
+        # upload while a chunk of it is being received.
+        now = timezone.now()
+        expired = ChunkedUpload.objects.filter(
+            Q(claimed_at__isnull=True)
+            | Q(claimed_at__lte=now - CLAIM_TIMEOUT),
+            created_at__lt=now - timedelta(
+                hours=settings.CHUNKED_UPLOAD_EXPIRY_HOURS),
+        )
+        deleted = 0
+        for upload_id in expired.values_list('id', flat=True).iterator():
+            with transaction.atomic():
+                upload = expired.select_for_update(
+                    skip_locked=True).filter(id=upload_id).first()
+                if upload is None:
+                    continue
+                if not dry_run:
+                    if upload.status == ChunkedUpload.ACTIVE:
+                        upload.file.delete(save=False)
+                    upload.delete()
+                deleted += 1
+        return deleted
+
+    def _delete_unused_blobs(self, dry_run):
+        # Delete blobs without references, locked against a worker
+        # storing the same content again
+        deleted = 0
+        for blob_id in ImageBlob.objects.filter(
+                ref_count__lte=0).values_list('id', flat=True).iterator():
+            with transaction.atomic():
+                blob = ImageBlob.objects.select_for_update().filter(
+                    id=blob_id,
+                    ref_count__lte=0,
+                ).first()
+                if blob is None:
+                    continue
+                if not dry_run:
+                    for variant in VARIANT_SIZES:
+                        default_storage.delete(
+                            variant_name(blob.name, variant))
+                    blob.delete()
+                deleted += 1
+        return deleted
+
+    def _delete_batch(self, batch, dry_run):
+        referenced = _referenced(list({base for base, _ in batch}))
+        deleted = 0
+        for base, path in batch:
+            if base not in referenced:
+                if not dry_run:
+                    os.remove(path)
+                deleted += 1
+        return deleted
+
+    def handle(self, *args, **options):
+        # Entry point for command
+        dry_run = options['dry_run']
+        cutoff = time.time() - options['min_age']
+        uploads = self._delete_expired_uploads(dry_run)
+        blobs = self._delete_unused_blobs(dry_run)
+
+        files = 0
+        batch = []
+        for directory in UPLOAD_DIRS:
+            if not default_storage.exists(directory):
+                continue
+            for name, path in _walk(directory):
+                # Skip files a worker may be about to reference
+                if os.path.getmtime(path) > cutoff:
+                    continue
+                batch.append((original_name(name), path))
+                if len(batch) >= options['batch_size']:
+                    files += self._delete_batch(batch, dry_run)
+                    batch = []
+        if batch:
+            files += self._delete_batch(batch, dry_run)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {uploads} expired uploads, {blobs} unused blobs & '
+            f'{files} orphaned files'
+        ))
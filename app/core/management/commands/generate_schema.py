@@ -0,0 +1,23 @@
+"""
+Django command to write the OpenAPI schema files served at /api/schema/
+"""
+from django.core.management.base import BaseCommand
+
+from core.schema import generate_schema
+
+
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Generate even when the code behind the schema is unchanged',
+        )
+
+    def handle(self, *args, **options):
+        # Entry point for command
+        if generate_schema(force=options['force']):
+            self.stdout.write(self.style.SUCCESS('Schema generated'))
+        else:
+            self.stdout.write('Schema up to date')
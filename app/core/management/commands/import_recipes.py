@@ -0,0 +1,48 @@
+"""
+Django command to import recipes exported by export_recipes
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe.backup import BATCH_SIZE, CONTENT_TYPES, import_recipes
+
+
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Owner of the imported recipes')
+        parser.add_argument('input', help='Exported NDJSON or CSV file')
+        parser.add_argument(
+            '--file-format',
+            choices=list(CONTENT_TYPES),
+            help='Taken from the file extension by default',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Recipes created per transaction',
+        )
+
+    def handle(self, *args, **options):
+        # Entry point for command
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No user {options["email"]}')
+
+        file_format = options['file_format'] or (
+            'csv' if options['input'].endswith('.csv') else 'ndjson')
+        with open(options['input'], newline='') as lines:
+            result = import_recipes(
+                user,
+                lines,
+                file_format,
+                options['batch_size'])
+
+        for error in result['errors']:
+            self.stderr.write(f'Line {error["line"]}: {error["errors"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result["created"]} recipes, '
+            f'{result["failed"]} failed'
+        ))
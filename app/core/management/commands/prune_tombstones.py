@@ -0,0 +1,22 @@
+"""
+Django command to delete tombstones older than the sync retention
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import Tombstone
+
+
+class Command(BaseCommand):
+
+    def handle(self, *args, **options):
+        # Entry point for command
+        cutoff = timezone.now() - timedelta(
+            days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+        deleted, _ = Tombstone.objects.filter(deleted_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Pruned {deleted} tombstones'
+        ))
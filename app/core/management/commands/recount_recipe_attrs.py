@@ -0,0 +1,27 @@
+"""
+Django command to recompute how many recipes use each tag & ingredient
+"""
+from django.core.management.base import BaseCommand
+
+from core.models import Tag, Ingredient
+from recipe.counts import update_all_recipe_counts
+
+
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows recounted per statement',
+        )
+
+    def handle(self, *args, **options):
+        # Entry point for command
+        tags = update_all_recipe_counts(Tag, options['batch_size'])
+        ingredients = update_all_recipe_counts(
+            Ingredient, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Recounted {tags} tags & {ingredients} ingredients'
+        ))
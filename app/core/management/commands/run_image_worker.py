@@ -0,0 +1,37 @@
+"""
+Django command to process queued image jobs
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.jobs import claim_next_job, run_job
+
+
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when the queue is empty',
+        )
+
+    def handle(self, *args, **options):
+        # Entry point for command
+        self.stdout.write('Waiting for image jobs...')
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+            run_job(job)
+            self.stdout.write(f'Image job {job.id} {job.status}')
@@ -0,0 +1,25 @@
+# Middleware of the core app
+from rest_framework.permissions import SAFE_METHODS
+
+from core.routers import mark_user_write, reset_use_primary, set_use_primary
+
+
+class ReplicaRoutingMiddleware:
+    # Safe-method requests may read from the replicas. Other requests use
+    # the primary & keep their user's reads on it for a while after.
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        safe = request.method in SAFE_METHODS
+        token = set_use_primary(not safe)
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_use_primary(token)
+
+        user = getattr(request, 'user', None)
+        if not safe and user is not None and user.is_authenticated:
+            mark_user_write(user.pk)
+        return response
@@ -0,0 +1,84 @@
+# Generated by Django 3.2.25 on 2026-10-17 04:15
+
+import core.models
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+# Frozen copy of dedupe_recipe_attrs.merge_duplicates, so later changes
+# to the command never change what this migration does
+def merge_duplicates(model, through, field_name):
+    # Keep the oldest row per (user, name) & move recipe links onto it
+    duplicates = model.objects.values('user', 'name').annotate(
+        keep_id=Min('id'),
+        total=Count('id'),
+    ).filter(total__gt=1)
+
+    for duplicate in duplicates.iterator():
+        keep_id = duplicate['keep_id']
+        extra_ids = list(model.objects.filter(
+            user=duplicate['user'],
+            name=duplicate['name'],
+        ).exclude(id=keep_id).values_list('id', flat=True))
+
+        linked = set(through.objects.filter(
+            **{f'{field_name}_id__in': extra_ids}
+        ).values_list('recipe_id', flat=True))
+        linked -= set(through.objects.filter(
+            **{f'{field_name}_id': keep_id}
+        ).values_list('recipe_id', flat=True))
+        through.objects.bulk_create([
+            through(recipe_id=recipe_id, **{f'{field_name}_id': keep_id})
+            for recipe_id in linked
+        ])
+
+        model.objects.filter(id__in=extra_ids).delete()
+
+
+def dedupe_recipe_attrs(apps, schema_editor):
+    Recipe = apps.get_model('core', 'Recipe')
+    for field_name, model_name in (('tag', 'Tag'), ('ingredient', 'Ingredient')):
+        merge_duplicates(
+            apps.get_model('core', model_name),
+            Recipe._meta.get_field(f'{field_name}s').remote_field.through,
+            field_name,
+        )
+
+
+def check_deferred_constraints(apps, schema_editor):
+    # The merge deletes rows with deferred FK checks pending, Postgres
+    # refuses to ALTER a table with pending trigger events
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_user_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_recipe_attrs, migrations.RunPython.noop),
+        migrations.RunPython(
+            check_deferred_constraints,
+            migrations.RunPython.noop,
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='image',
+            field=models.ImageField(null=True, upload_to=core.models.user_image_file_path),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', '-id'], name='recipe_user_id_desc_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='unique_ingredient_user_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='unique_tag_user_name'),
+        ),
+    ]
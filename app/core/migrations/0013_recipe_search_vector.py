@@ -0,0 +1,79 @@
+# Generated by Django 3.2.25 on 2026-10-17 04:32
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, transaction
+from django.db.models import OuterRef, Subquery
+
+
+# Frozen copy of recipe.search as of this migration, so later changes to
+# it never change what this migration does
+SEARCH_CONFIG = 'english'
+
+
+def _names(through, field_name):
+    # Space separated names linked to the outer recipe
+    return Subquery(
+        through.objects.filter(recipe_id=OuterRef('pk')).values(
+            'recipe_id'
+        ).annotate(
+            names=StringAgg(f'{field_name}__name', ' '),
+        ).values('names')
+    )
+
+
+def search_vector(recipe_model):
+    tags = recipe_model._meta.get_field('tags').remote_field.through
+    ingredients = recipe_model._meta.get_field(
+        'ingredients').remote_field.through
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+        + SearchVector(_names(tags, 'tag'), weight='C', config=SEARCH_CONFIG)
+        + SearchVector(
+            _names(ingredients, 'ingredient'),
+            weight='C',
+            config=SEARCH_CONFIG)
+    )
+
+
+def backfill_search_vectors(apps, schema_editor):
+    # In id batches with a transaction each, so no statement or
+    # transaction holds locks on the whole table
+    Recipe = apps.get_model('core', 'Recipe')
+    batch_size = 5000
+    last_id = Recipe.objects.order_by('-id').values_list(
+        'id', flat=True).first() or 0
+    for start in range(0, last_id, batch_size):
+        with transaction.atomic(using=schema_editor.connection.alias):
+            Recipe.objects.filter(
+                id__gt=start,
+                id__lte=start + batch_size,
+            ).update(search_vector=search_vector(Recipe))
+
+
+class Migration(migrations.Migration):
+    # Each backfill batch commits on its own
+    atomic = False
+
+    dependencies = [
+        ('core', '0012_imageblob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(
+            backfill_search_vectors,
+            migrations.RunPython.noop,
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recipe_search_vector_idx'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 3.2.25 on 2026-10-17 04:39
+
+from django.db import migrations, models, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+# Frozen copy of recipe.counts as of this migration, so later changes to
+# it never change what this migration does
+def update_recipe_counts(queryset):
+    # Recount a tag or ingredient queryset from the through table
+    attr_model = queryset.model
+    through = attr_model._meta.get_field('recipe').through
+    column = f'{attr_model._meta.model_name}_id'
+    usage = through.objects.filter(
+        **{column: OuterRef('pk')}
+    ).values(column).annotate(count=Count('pk')).values('count')
+    queryset.update(recipe_count=Coalesce(Subquery(usage), 0))
+
+
+def backfill_recipe_counts(apps, schema_editor):
+    # In id batches with a transaction each, so no statement or
+    # transaction holds locks on the whole table
+    batch_size = 5000
+    for model_name in ('Tag', 'Ingredient'):
+        attr_model = apps.get_model('core', model_name)
+        last_id = attr_model.objects.order_by('-id').values_list(
+            'id', flat=True).first() or 0
+        for start in range(0, last_id, batch_size):
+            with transaction.atomic(using=schema_editor.connection.alias):
+                update_recipe_counts(attr_model.objects.filter(
+                    id__gt=start,
+                    id__lte=start + batch_size,
+                ))
+
+
+class Migration(migrations.Migration):
+    # Each backfill batch commits on its own
+    atomic = False
+
+    dependencies = [
+        ('core', '0015_recipe_attr_name_trgm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(
+            backfill_recipe_counts,
+            migrations.RunPython.noop,
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(condition=models.Q(('recipe_count__gt', 0)), fields=['user', '-name'], name='ingredient_user_assigned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(condition=models.Q(('recipe_count__gt', 0)), fields=['user', '-name'], name='tag_user_assigned_idx'),
+        ),
+    ]
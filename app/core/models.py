@@ -3,7 +3,10 @@ import uuid
 import os
 
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.functions import Upper
 from django.contrib.auth.models import (
     AbstractBaseUser, BaseUserManager, PermissionsMixin
 )
@@ -21,6 +24,17 @@ def recipe_image_file_path(instance, filename):
     return os.path.join('uploads', 'recipe', filename)
 
 
+def image_blob_file_path(digest, ext):
+    # Content addressed, so identical images share one file
+    return os.path.join('uploads', 'images', digest[:2], f'{digest}{ext}')
+
+
+def image_job_file_path(instance, filename):
+    ext = os.path.splitext(filename)[1]
+    filename = f'{uuid.uuid4()}{ext}'
+    return os.path.join('uploads', 'pending', filename)
+
+
 class UserManager(BaseUserManager):
     """Manager for users"""
     def create_user(self, email, password=None, **extra_fields):
@@ -67,29 +81,240 @@ class Recipe(models.Model):
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Title, description, tag & ingredient names, kept up to date by
+    # recipe.search
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-id'],
+                name='recipe_user_id_desc_idx'),
+            GinIndex(
+                fields=['search_vector'],
+                name='recipe_search_vector_idx'),
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='recipe_user_updated_idx'),
+            models.Index(
+                fields=['user', 'time_minutes', 'id'],
+                name='recipe_user_time_idx'),
+            models.Index(
+                fields=['user', 'price', 'id'],
+                name='recipe_user_price_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
 
-class Tag(models.Model):
+class RecipeCountMixin:
+    # recipe_count only changes through relative updates in recipe.counts,
+    # so saving an instance never writes back a possibly stale count
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'recipe_count'
+            ]
+        super().save(*args, **kwargs)
+
+
+class Tag(RecipeCountMixin, models.Model):
     # Tag objects
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
     name = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Recipes using it, kept up to date by recipe.signals
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'],
+                name='unique_tag_user_name'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='tag_user_updated_idx'),
+            # Case insensitive prefix search for autocomplete. On the
+            # UPPER(name) that name__istartswith compiles to on Postgres.
+            GinIndex(
+                OpClass('user', name='int8_ops'),
+                OpClass(Upper('name'), name='gin_trgm_ops'),
+                name='tag_user_name_trgm_idx'),
+            # assigned_only listings, by name
+            models.Index(
+                fields=['user', '-name'],
+                name='tag_user_assigned_idx',
+                condition=models.Q(recipe_count__gt=0)),
+        ]
 
     def __str__(self):
         return self.name
 
 
-class Ingredient(models.Model):
+class Ingredient(RecipeCountMixin, models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
     name = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Recipes using it, kept up to date by recipe.signals
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'],
+                name='unique_ingredient_user_name'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='ingredient_user_updated_idx'),
+            # Case insensitive prefix search for autocomplete. On the
+            # UPPER(name) that name__istartswith compiles to on Postgres.
+            GinIndex(
+                OpClass('user', name='int8_ops'),
+                OpClass(Upper('name'), name='gin_trgm_ops'),
+                name='ingredient_user_name_trgm_idx'),
+            # assigned_only listings, by name
+            models.Index(
+                fields=['user', '-name'],
+                name='ingredient_user_assigned_idx',
+                condition=models.Q(recipe_count__gt=0)),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class Tombstone(models.Model):
+    # Record of a deleted recipe, tag or ingredient for delta sync
+    RECIPE = 'recipe'
+    TAG = 'tag'
+    INGREDIENT = 'ingredient'
+    MODEL_CHOICES = [
+        (RECIPE, 'Recipe'),
+        (TAG, 'Tag'),
+        (INGREDIENT, 'Ingredient'),
+    ]
+
+    # No FK constraint, tombstones are written while a user's rows are
+    # cascade deleted & are pruned by age instead
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+    )
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'deleted_at'],
+                name='tombstone_user_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.model} {self.object_id}'
+
+
+class ImageJob(models.Model):
+    # Queued processing of an uploaded recipe or user image
+    RECIPE = 'recipe'
+    USER = 'user'
+    TARGET_CHOICES = [
+        (RECIPE, 'Recipe'),
+        (USER, 'User'),
+    ]
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    target = models.CharField(max_length=20, choices=TARGET_CHOICES)
+    object_id = models.BigIntegerField()
+    source = models.FileField(upload_to=image_job_file_path)
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+    )
+    error = models.TextField(blank=True)
+    attempts = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['status', 'id'],
+                name='imagejob_status_id_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.target} {self.object_id} {self.status}'
+
+
+class ChunkedUpload(models.Model):
+    # Image upload received in chunks before it is queued as a job
+    ACTIVE = 'active'
+    COMPLETE = 'complete'
+    STATUS_CHOICES = [
+        (ACTIVE, 'Active'),
+        (COMPLETE, 'Complete'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    target = models.CharField(max_length=20, choices=ImageJob.TARGET_CHOICES)
+    object_id = models.BigIntegerField()
+    file = models.FileField(upload_to=image_job_file_path)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=ACTIVE,
+    )
+    # Set while a chunk is received, so only one request writes at once
+    claimed_at = models.DateTimeField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.target} {self.object_id} {self.offset}/{self.size}'
+
+
+class ImageBlob(models.Model):
+    # Processed image stored once per content hash
+    digest = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return self.name
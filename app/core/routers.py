@@ -0,0 +1,79 @@
+# Route reads to replicas, writes & reads right after them to the primary
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# Outside of requests (commands, workers) everything uses the primary,
+# ReplicaRoutingMiddleware lets safe-method requests read from replicas
+_use_primary = ContextVar('use_primary', default=True)
+
+
+def set_use_primary(value):
+    # Returns a token for reset_use_primary
+    return _use_primary.set(value)
+
+
+def reset_use_primary(token):
+    _use_primary.reset(token)
+
+
+def pin_primary():
+    # Read from the primary for the rest of the request
+    _use_primary.set(True)
+
+
+def primary_pinned():
+    return _use_primary.get()
+
+
+@contextmanager
+def primary():
+    # Read from the primary inside the block
+    token = set_use_primary(True)
+    try:
+        yield
+    finally:
+        reset_use_primary(token)
+
+
+def _marker_key(user_id):
+    return f'db-primary-sticky:{user_id}'
+
+
+def mark_user_write(user_id):
+    # The user's reads stay on the primary until the replicas caught up
+    caches[settings.DB_ROUTING_CACHE_ALIAS].set(
+        _marker_key(user_id), True, settings.DB_PRIMARY_STICKY_SECONDS)
+
+
+def user_wrote_recently(user_id):
+    return bool(
+        caches[settings.DB_ROUTING_CACHE_ALIAS].get(_marker_key(user_id)))
+
+
+class PrimaryReplicaRouter:
+    # Primary/replica routing for DATABASES['default'] & settings.DB_REPLICAS
+
+    def db_for_read(self, model, **hints):
+        if _use_primary.get() or not settings.DB_REPLICAS:
+            return DEFAULT_DB_ALIAS
+        # A transaction on the primary sees its own uncommitted writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DB_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema through replication
+        return db == DEFAULT_DB_ALIAS
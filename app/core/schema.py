@@ -0,0 +1,135 @@
+# OpenAPI schema files generated ahead of requests by generate_schema
+import gzip
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import django
+import drf_spectacular
+import rest_framework
+from django.conf import settings
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+
+
+RENDERERS = {
+    'yaml': OpenApiYamlRenderer,
+    'json': OpenApiJsonRenderer,
+}
+MANIFEST = 'manifest.json'
+# Project directories that never shape the schema
+SKIPPED_DIRS = {'tests', 'test', 'migrations', 'management', '__pycache__'}
+
+
+def _schema_dir():
+    return Path(settings.API_SCHEMA_DIR)
+
+
+def _etag(body):
+    return f'"{hashlib.md5(body).hexdigest()}"'
+
+
+def source_fingerprint():
+    # Hash of the project code behind the URLconf (urls, views,
+    # serializers & models) & of the versions & settings of the schema
+    # libraries, a changed schema always changes it
+    digest = hashlib.sha256(json.dumps([
+        django.__version__,
+        rest_framework.VERSION,
+        drf_spectacular.__version__,
+        settings.SPECTACULAR_SETTINGS,
+    ], sort_keys=True, default=str).encode())
+
+    base_dir = Path(settings.BASE_DIR)
+    paths = []
+    for root, dirs, files in os.walk(base_dir):
+        dirs[:] = sorted(name for name in dirs if name not in SKIPPED_DIRS)
+        paths.extend(
+            Path(root, name) for name in files if name.endswith('.py'))
+    for path in sorted(paths):
+        digest.update(str(path.relative_to(base_dir)).encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def _read_manifest(directory):
+    try:
+        return json.loads((directory / MANIFEST).read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write(path, content):
+    # Replace whole, readers never see a partly written file
+    temp_path = path.with_name(f'.{path.name}.tmp')
+    temp_path.write_bytes(content)
+    os.replace(temp_path, path)
+
+
+def generate_schema(force=False):
+    # Write the schema in every format, plain & gzipped. Returns False
+    # without generating when the files match the current code.
+    directory = _schema_dir()
+    fingerprint = source_fingerprint()
+    manifest = _read_manifest(directory)
+    if not force and manifest \
+            and manifest.get('fingerprint') == fingerprint:
+        return False
+
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS(
+        urlconf=spectacular_settings.SERVE_URLCONF)
+    schema = generator.get_schema(
+        request=None, public=spectacular_settings.SERVE_PUBLIC)
+
+    directory.mkdir(parents=True, exist_ok=True)
+    etags = {}
+    for file_format, renderer_class in RENDERERS.items():
+        body = renderer_class().render(schema, renderer_context={})
+        etags[file_format] = _etag(body)
+        _write(directory / f'schema.{file_format}', body)
+        _write(
+            directory / f'schema.{file_format}.gz',
+            gzip.compress(body, mtime=0))
+    # Written last, it marks the files above as complete
+    _write(directory / MANIFEST, json.dumps({
+        'fingerprint': fingerprint,
+        'etags': etags,
+    }).encode())
+    return True
+
+
+class SchemaFiles:
+    # The generated files of each format held in memory, reloaded when
+    # the manifest is replaced
+
+    def __init__(self):
+        self._key = None
+        self._files = {}
+
+    def get(self, file_format):
+        # (etag, body, gzipped body) of a format, None when not generated
+        directory = _schema_dir()
+        try:
+            key = (directory, (directory / MANIFEST).stat().st_mtime_ns)
+        except FileNotFoundError:
+            return None
+
+        if key != self._key:
+            manifest = _read_manifest(directory) or {'etags': {}}
+            files = {}
+            for name, etag in manifest['etags'].items():
+                try:
+                    files[name] = (
+                        etag,
+                        (directory / f'schema.{name}').read_bytes(),
+                        (directory / f'schema.{name}.gz').read_bytes(),
+                    )
+                except FileNotFoundError:
+                    continue
+            self._files = files
+            self._key = key
+        return self._files.get(file_format)
+
+
+schema_files = SchemaFiles()
@@ -0,0 +1,134 @@
+# Test cached token authentication
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import (
+    _generation_key,
+    _shared_key,
+    token_cache,
+)
+
+
+ME_URL = reverse('user:me')
+
+
+class CachedTokenAuthenticationTests(TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+            name='Test Name')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_lookup_cached(self):
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_deleted_token_rejected(self):
+        self.client.get(ME_URL)
+        self.token.delete()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_inactive_user_rejected(self):
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_update_refreshes_cached_user(self):
+        self.client.get(ME_URL)
+        self.client.patch(ME_URL, {'name': 'Updated Name'})
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'Updated Name')
+
+    def _invalidate_elsewhere(self):
+        # What invalidate_token does in another process, whose local
+        # cache isn't this one
+        cache.incr(_generation_key(self.token.key))
+        cache.delete(_shared_key(self.token.key))
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            is_active=False)
+
+    @override_settings(TOKEN_AUTH_CACHE_ALIAS='default')
+    def test_local_hit_checked_against_shared_generation(self):
+        cache.clear()
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self._invalidate_elsewhere()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(TOKEN_AUTH_CACHE_ALIAS='default')
+    def test_shared_cache_holds_no_password(self):
+        cache.clear()
+        self.client.get(ME_URL)
+
+        _, values = cache.get(_shared_key(self.token.key))
+
+        self.assertEqual(values['email'], self.user.email)
+        self.assertNotIn('password', values)
+
+    @override_settings(TOKEN_AUTH_CACHE_ALIAS='default')
+    def test_user_from_shared_cache_keeps_password(self):
+        cache.clear()
+        self.client.get(ME_URL)
+        # As seen by another process, with only the shared copy
+        token_cache.clear()
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.data['email'], self.user.email)
+
+        token_cache.clear()
+        res = self.client.patch(ME_URL, {'name': 'Updated Name'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, 'Updated Name')
+        self.assertTrue(self.user.check_password('testpass123'))
+
+    @override_settings(
+        TOKEN_AUTH_CACHE_ALIAS=None,
+        TOKEN_AUTH_CACHE_TTL=60,
+        TOKEN_AUTH_CACHE_LOCAL_TTL=5)
+    def test_local_only_cache_expires_quickly(self):
+        self.client.get(ME_URL)
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            is_active=False)
+
+        later = time.monotonic() + 6
+        with patch('core.authentication.time.monotonic', return_value=later):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
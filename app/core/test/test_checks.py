@@ -0,0 +1,51 @@
+# Test system checks
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+
+from core.checks import check_image_encoder, check_shared_caches
+
+
+class ImageEncoderCheckTests(SimpleTestCase):
+
+    def test_pillow_supports_webp(self):
+        self.assertEqual(check_image_encoder(None), [])
+
+    @patch('core.checks.features.check', return_value=False)
+    def test_missing_webp_is_error(self, patched_check):
+        errors = check_image_encoder(None)
+
+        self.assertEqual([error.id for error in errors], ['core.E001'])
+        patched_check.assert_called_once_with('webp')
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': 'memcached:11211',
+    }})
+    def test_shared_cache_passes(self):
+        self.assertEqual(check_shared_caches(None), [])
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }})
+    def test_process_local_cache_is_error(self):
+        errors = check_shared_caches(None)
+
+        self.assertEqual(
+            [error.id for error in errors], ['core.E002'] * 3)
+
+    @override_settings(
+        CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': 'memcached:11211',
+        }},
+        TOKEN_AUTH_CACHE_ALIAS=None,
+    )
+    def test_missing_token_cache_alias_is_error(self):
+        errors = check_shared_caches(None)
+
+        self.assertEqual(len(errors), 1)
+        self.assertIn('TOKEN_AUTH_CACHE_ALIAS', errors[0].msg)
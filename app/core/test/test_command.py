@@ -1,8 +1,37 @@
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 from unittest.mock import patch
 from psycopg2 import OperationalError as Psycopg2Error  # type: ignore
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.utils import timezone
+
+from core.jobs import CLAIM_TIMEOUT, MAX_ATTEMPTS, claim_next_job
+from core.management.commands.dedupe_recipe_attrs import merge_duplicates
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+    Tombstone,
+    ChunkedUpload,
+    ImageBlob,
+    ImageJob,
+)
+from core.uploads import start_upload
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -23,3 +52,322 @@ class CommandTest(SimpleTestCase):
         call_command('wait_for_db')
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+
+class DedupeRecipeAttrsCommandTest(TestCase):
+
+    def test_dedupe_keeps_unique_rows(self):
+        user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123')
+        recipe = Recipe.objects.create(
+            user=user,
+            title='Sample recipe',
+            time_minutes=5,
+            price=Decimal('5.50'))
+        tag = Tag.objects.create(user=user, name='Tag1')
+        recipe.tags.add(tag)
+        Ingredient.objects.create(user=user, name='Ingredient1')
+        out = StringIO()
+
+        call_command('dedupe_recipe_attrs', stdout=out)
+
+        self.assertIn('Merged 0 duplicate tags', out.getvalue())
+        self.assertEqual(list(recipe.tags.all()), [tag])
+        self.assertEqual(Ingredient.objects.count(), 1)
+
+
+class PruneTombstonesCommandTest(TestCase):
+
+    def test_prune_old_tombstones(self):
+        user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123')
+        old = Tombstone.objects.create(user=user, model='tag', object_id=1)
+        Tombstone.objects.filter(id=old.id).update(
+            deleted_at=timezone.now() - timedelta(days=365))
+        recent = Tombstone.objects.create(
+            user=user,
+            model='tag',
+            object_id=2)
+
+        call_command('prune_tombstones', stdout=StringIO())
+
+        self.assertEqual(list(Tombstone.objects.all()), [recent])
+
+
+class MergeDuplicatesTest(TransactionTestCase):
+    # Duplicates only exist before the (user, name) constraints, so the
+    # merge runs on the models of the migration before them
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.latest = self.executor.loader.graph.leaf_nodes('core')
+        self.executor.migrate([('core', '0006_user_image')])
+        self.executor.loader.build_graph()
+        self.apps = self.executor.loader.project_state(
+            ('core', '0006_user_image')).apps
+
+    def tearDown(self):
+        # Nothing left to backfill on the way forward
+        self.apps.get_model('core', 'User').objects.all().delete()
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.latest)
+
+    def _create_duplicates(self):
+        User = self.apps.get_model('core', 'User')
+        Recipe = self.apps.get_model('core', 'Recipe')
+        Tag = self.apps.get_model('core', 'Tag')
+        user = User.objects.create(email='user@example.com')
+        other = User.objects.create(email='other@example.com')
+        keep = Tag.objects.create(user=user, name='Vegan')
+        extra = Tag.objects.create(user=user, name='Vegan')
+        unique = Tag.objects.create(user=other, name='Vegan')
+        both = Recipe.objects.create(
+            user=user, title='Both', time_minutes=5, price=Decimal('1'))
+        only_extra = Recipe.objects.create(
+            user=user, title='Extra', time_minutes=5, price=Decimal('1'))
+        both.tags.add(keep, extra)
+        only_extra.tags.add(extra)
+        return Tag, keep, extra, unique, both, only_extra
+
+    def _assert_merged(self, Tag, keep, extra, unique, both, only_extra):
+        self.assertEqual(
+            set(Tag.objects.values_list('id', flat=True)),
+            {keep.id, unique.id})
+        self.assertEqual(
+            list(both.tags.values_list('id', flat=True)), [keep.id])
+        self.assertEqual(
+            list(only_extra.tags.values_list('id', flat=True)), [keep.id])
+
+    def test_merge_relinks_recipes_and_deletes_extra_rows(self):
+        Tag, *objs = self._create_duplicates()
+        Recipe = self.apps.get_model('core', 'Recipe')
+
+        merged = merge_duplicates(
+            Tag, Recipe._meta.get_field('tags').remote_field.through, 'tag')
+
+        self.assertEqual(merged, 1)
+        self._assert_merged(Tag, *objs)
+
+    def test_constraint_migration_merges_duplicates(self):
+        Tag, *objs = self._create_duplicates()
+
+        self.executor.migrate([('core', '0007_unique_attr_names_and_indexes')])
+
+        self._assert_merged(Tag, *objs)
+
+
+class RecountRecipeAttrsCommandTest(TestCase):
+
+    def test_recount_repairs_counts(self):
+        user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123')
+        recipe = Recipe.objects.create(
+            user=user,
+            title='Sample recipe',
+            time_minutes=5,
+            price=Decimal('5.50'))
+        tag = Tag.objects.create(user=user, name='Tag1')
+        ingredient = Ingredient.objects.create(user=user, name='Ingredient1')
+        recipe.tags.add(tag)
+        Tag.objects.update(recipe_count=7)
+        Ingredient.objects.update(recipe_count=3)
+
+        call_command('recount_recipe_attrs', batch_size=1, stdout=StringIO())
+
+        tag.refresh_from_db()
+        ingredient.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 1)
+        self.assertEqual(ingredient.recipe_count, 0)
+
+
+class ExportImportRecipesCommandTest(TestCase):
+
+    def test_export_then_import(self):
+        user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123')
+        recipe = Recipe.objects.create(
+            user=user,
+            title='Sample recipe',
+            time_minutes=5,
+            price=Decimal('5.50'))
+        recipe.tags.add(Tag.objects.create(user=user, name='Tag1'))
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123')
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'recipes.csv')
+            call_command(
+                'export_recipes',
+                'user@example.com',
+                file_format='csv',
+                output=path)
+            out = StringIO()
+            call_command('import_recipes', 'other@example.com', path,
+                         stdout=out)
+
+        self.assertIn('Imported 1 recipes, 0 failed', out.getvalue())
+        imported = Recipe.objects.get(user=other)
+        self.assertEqual(imported.title, 'Sample recipe')
+        self.assertEqual(
+            list(imported.tags.values_list('name', flat=True)), ['Tag1'])
+
+
+class BenchmarkDbConnectionsCommandTest(TransactionTestCase):
+
+    def test_benchmark_reports_savings(self):
+        out = StringIO()
+
+        call_command('benchmark_db_connections', requests=3, stdout=out)
+
+        self.assertIn('New connection per request', out.getvalue())
+        self.assertIn('Saved per request', out.getvalue())
+
+
+class RunImageWorkerCommandTest(TestCase):
+
+    def test_invalid_image_job_failed(self):
+        user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123')
+        job = ImageJob.objects.create(
+            user=user,
+            target=ImageJob.USER,
+            object_id=user.id,
+            source=ContentFile(b'not an image', name='image.jpg'))
+
+        call_command('run_image_worker', '--once', stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImageJob.FAILED)
+        self.assertEqual(job.attempts, 1)
+        self.assertTrue(job.error)
+        self.assertFalse(job.source)
+
+    @patch('core.jobs.logger')
+    @patch('core.jobs.process_image', side_effect=KeyError('boom'))
+    def test_unexpected_error_fails_job_not_worker(
+            self, patched_process, patched_logger):
+        user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123')
+        jobs = [
+            ImageJob.objects.create(
+                user=user,
+                target=ImageJob.USER,
+                object_id=user.id,
+                source=ContentFile(b'image', name='image.jpg'))
+            for _ in range(2)
+        ]
+
+        call_command('run_image_worker', '--once', stdout=StringIO())
+
+        for job in jobs:
+            job.refresh_from_db()
+            self.assertEqual(job.status, ImageJob.FAILED)
+            self.assertEqual(job.error, 'Image processing failed.')
+            self.assertFalse(job.source)
+        self.assertEqual(patched_logger.exception.call_count, 2)
+
+    def test_abandoned_job_failed(self):
+        user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123')
+        job = ImageJob.objects.create(
+            user=user,
+            target=ImageJob.USER,
+            object_id=user.id,
+            source=ContentFile(b'image', name='image.jpg'),
+            status=ImageJob.RUNNING,
+            attempts=MAX_ATTEMPTS,
+            claimed_at=timezone.now() - CLAIM_TIMEOUT - timedelta(minutes=1))
+
+        self.assertIsNone(claim_next_job())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImageJob.FAILED)
+        self.assertIn('Abandoned', job.error)
+        self.assertFalse(job.source)
+
+
+class GcImagesCommandTest(TestCase):
+
+    def setUp(self):
+        # Own MEDIA_ROOT, the command deletes every unreferenced file
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def save_file(self, name, age=7200):
+        name = default_storage.save(name, ContentFile(b'image'))
+        path = default_storage.path(name)
+        modified = os.path.getmtime(path) - age
+        os.utime(path, (modified, modified))
+        return name
+
+    def test_orphaned_files_deleted(self):
+        orphan = self.save_file('uploads/recipe/orphan.webp')
+        recent = self.save_file('uploads/recipe/recent.webp', age=0)
+        used = self.save_file('uploads/recipe/used.webp')
+        used_variant = self.save_file('uploads/recipe/used_thumbnail.webp')
+        Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=5,
+            price=Decimal('5.50'),
+            image=used)
+
+        call_command('gc_images', stdout=StringIO())
+
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertTrue(default_storage.exists(recent))
+        self.assertTrue(default_storage.exists(used))
+        self.assertTrue(default_storage.exists(used_variant))
+
+    @override_settings(CHUNKED_UPLOAD_EXPIRY_HOURS=24)
+    def test_expired_uploads_deleted(self):
+        old = timezone.now() - timedelta(hours=25)
+        expired = start_upload(self.user, self.user, 10)
+        finished = start_upload(self.user, self.user, 10)
+        receiving = start_upload(self.user, self.user, 10)
+        recent = start_upload(self.user, self.user, 10)
+        ChunkedUpload.objects.exclude(pk=recent.pk).update(created_at=old)
+        ChunkedUpload.objects.filter(pk=finished.pk).update(
+            status=ChunkedUpload.COMPLETE)
+        ImageJob.objects.create(
+            user=self.user,
+            target=finished.target,
+            object_id=finished.object_id,
+            source=finished.file.name)
+        ChunkedUpload.objects.filter(pk=receiving.pk).update(
+            claimed_at=timezone.now())
+
+        call_command('gc_images', '--min-age', '0', stdout=StringIO())
+
+        self.assertEqual(
+            set(ChunkedUpload.objects.values_list('id', flat=True)),
+            {receiving.id, recent.id})
+        self.assertFalse(default_storage.exists(expired.file.name))
+        # Owned by the job of the finished upload
+        self.assertTrue(default_storage.exists(finished.file.name))
+
+    def test_unreferenced_blob_deleted(self):
+        name = self.save_file('uploads/images/ab/abc.webp', age=0)
+        ImageBlob.objects.create(digest='abc', name=name, ref_count=0)
+
+        call_command('gc_images', stdout=StringIO())
+
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertFalse(default_storage.exists(name))
@@ -0,0 +1,53 @@
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase
+
+from core.backends.postgresql.base import DatabaseWrapper
+
+
+class HealthCheckTests(SimpleTestCase):
+    # Test checking reused connections before the first query
+
+    def setUp(self):
+        self.wrapper = DatabaseWrapper({
+            'NAME': 'test',
+            'AUTOCOMMIT': True,
+            'CONN_MAX_AGE': None,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+            'TIME_ZONE': None,
+        })
+        self.wrapper.connection = MagicMock()
+        self.wrapper.autocommit = True
+        self.wrapper.health_check_enabled = True
+
+    @patch.object(DatabaseWrapper, 'close')
+    @patch.object(DatabaseWrapper, 'is_usable', return_value=False)
+    def test_broken_connection_closed_once_per_request(
+            self, patched_usable, patched_close):
+        self.wrapper.close_if_unusable_or_obsolete()
+
+        self.wrapper.close_if_health_check_failed()
+        self.wrapper.close_if_health_check_failed()
+
+        patched_usable.assert_called_once()
+        patched_close.assert_called_once()
+
+    @patch.object(DatabaseWrapper, 'close')
+    @patch.object(DatabaseWrapper, 'is_usable', return_value=True)
+    def test_healthy_connection_kept(self, patched_usable, patched_close):
+        self.wrapper.close_if_unusable_or_obsolete()
+
+        self.wrapper.close_if_health_check_failed()
+
+        patched_usable.assert_called_once()
+        patched_close.assert_not_called()
+
+    @patch.object(DatabaseWrapper, 'is_usable')
+    def test_disabled_health_checks(self, patched_usable):
+        self.wrapper.health_check_enabled = False
+        self.wrapper.close_if_unusable_or_obsolete()
+
+        self.wrapper.close_if_health_check_failed()
+
+        patched_usable.assert_not_called()
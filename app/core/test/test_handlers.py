@@ -0,0 +1,55 @@
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.signals import request_finished
+from django.db import close_old_connections
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import TestCase
+
+from core.handlers import StreamingASGIHandler
+
+
+class StreamingASGIHandlerTests(TestCase):
+    # Test sending responses from the ASGI handler
+
+    def setUp(self):
+        # Closing a response sends request_finished, which would close the
+        # test's connection like at the end of a real request
+        request_finished.disconnect(close_old_connections)
+        self.addCleanup(request_finished.connect, close_old_connections)
+
+    def _send(self, response):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        async_to_sync(StreamingASGIHandler().send_response)(response, send)
+        return messages
+
+    def test_streamed_parts_use_orm_off_event_loop(self):
+        """Test parts needing the ORM are produced outside the loop"""
+        get_user_model().objects.create_user('test@example.com', 'pass123')
+
+        def parts():
+            # Raises SynchronousOnlyOperation on the event loop
+            yield str(get_user_model().objects.count())
+            yield 'done'
+
+        response = StreamingHttpResponse(parts(), content_type='text/plain')
+        messages = self._send(response)
+
+        self.assertEqual(messages[0]['type'], 'http.response.start')
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertIn(
+            (b'Content-Type', b'text/plain'), messages[0]['headers'])
+        self.assertEqual(
+            b''.join(message.get('body', b'') for message in messages[1:]),
+            b'1done',
+        )
+        self.assertFalse(messages[-1].get('more_body', False))
+
+    def test_plain_response_sent_whole(self):
+        """Test non streaming responses are sent as before"""
+        messages = self._send(HttpResponse(b'body'))
+
+        self.assertEqual(messages[1]['body'], b'body')
@@ -0,0 +1,93 @@
+# Test serving uploaded media
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+
+def media_url(name):
+    return reverse('media', args=[name])
+
+
+class MediaViewTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.name = default_storage.save(
+            'uploads/images/ab/abc.webp',
+            ContentFile(b'image'))
+        default_storage.save(
+            'uploads/images/ab/abc_thumbnail.webp',
+            ContentFile(b'thumbnail'))
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=5,
+            price=Decimal('5.50'),
+            image=self.name)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def test_auth_required(self):
+        res = APIClient().get(media_url(self.name))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_owner_gets_file(self):
+        res = self.client.get(media_url(self.name))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), b'image')
+        self.assertEqual(res['Content-Type'], 'image/webp')
+        self.assertIn('immutable', res['Cache-Control'])
+
+    def test_owner_gets_variant(self):
+        res = self.client.get(
+            media_url('uploads/images/ab/abc_thumbnail.webp'))
+
+        self.assertEqual(b''.join(res.streaming_content), b'thumbnail')
+
+    def test_other_user_not_found(self):
+        other_user = get_user_model().objects.create_user(
+            email='other@example.com',
+            password='testpass123')
+        self.client.force_authenticate(other_user)
+
+        res = self.client.get(media_url(self.name))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_path_traversal_not_found(self):
+        res = self.client.get(
+            media_url('uploads/images/../../../etc/passwd'))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_accel_redirect(self):
+        res = self.client.get(media_url(self.name))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res['X-Accel-Redirect'],
+            f'/protected-media/{self.name}')
+        self.assertEqual(res.content, b'')
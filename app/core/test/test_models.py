@@ -1,6 +1,7 @@
 # Test Models
 from decimal import Decimal
 from unittest.mock import patch
+from django.db import IntegrityError
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 
@@ -73,6 +74,31 @@ class ModelTests(TestCase):
 
         self.assertEqual(str(tag), tag.name)
 
+    def test_recipe_updated_at_set_on_save(self):
+        recipe = models.Recipe.objects.create(
+            user=create_user(),
+            title='Sample recipe name',
+            time_minutes=5,
+            price=Decimal('5.50'),
+        )
+        created_at = recipe.updated_at
+
+        recipe.title = 'New recipe name'
+        recipe.save()
+
+        self.assertIsNotNone(created_at)
+        self.assertGreater(recipe.updated_at, created_at)
+
+    def test_tag_name_unique_per_user(self):
+        user = create_user()
+        models.Tag.objects.create(user=user, name='Tag1')
+        models.Tag.objects.create(
+            user=create_user(email='user2@example.com'),
+            name='Tag1')
+
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=user, name='Tag1')
+
     def test_create_ingredient(self):
         user = create_user()
         ingredient = models.Ingredient.objects.create(
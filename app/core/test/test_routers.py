@@ -0,0 +1,145 @@
+# Test primary/replica database routing
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import override_settings
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from core.authentication import CachedTokenAuthentication, token_cache
+from core.middleware import ReplicaRoutingMiddleware
+from core.models import Recipe
+from core.routers import (
+    PrimaryReplicaRouter,
+    mark_user_write,
+    primary,
+    primary_pinned,
+    reset_use_primary,
+    set_use_primary,
+    user_wrote_recently,
+)
+
+
+@override_settings(DB_REPLICAS=['replica1'])
+class PrimaryReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_use_primary_outside_requests(self):
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+    def test_reads_use_replica_when_allowed(self):
+        token = set_use_primary(False)
+        try:
+            self.assertEqual(self.router.db_for_read(Recipe), 'replica1')
+            with primary():
+                self.assertEqual(self.router.db_for_read(Recipe), 'default')
+        finally:
+            reset_use_primary(token)
+
+    def test_writes_use_primary(self):
+        token = set_use_primary(False)
+        try:
+            self.assertEqual(self.router.db_for_write(Recipe), 'default')
+        finally:
+            reset_use_primary(token)
+
+    @override_settings(DB_REPLICAS=[])
+    def test_reads_use_primary_without_replicas(self):
+        token = set_use_primary(False)
+        try:
+            self.assertEqual(self.router.db_for_read(Recipe), 'default')
+        finally:
+            reset_use_primary(token)
+
+    def test_migrations_only_on_primary(self):
+        self.assertTrue(self.router.allow_migrate('default', 'core'))
+        self.assertFalse(self.router.allow_migrate('replica1', 'core'))
+
+
+class ReplicaRoutingMiddlewareTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123')
+        self.factory = RequestFactory()
+        self.pinned = []
+
+    def _get_response(self, request):
+        self.pinned.append(primary_pinned())
+        return HttpResponse()
+
+    def test_safe_requests_may_use_replicas(self):
+        middleware = ReplicaRoutingMiddleware(self._get_response)
+        request = self.factory.get('/')
+        request.user = self.user
+
+        middleware(request)
+
+        self.assertEqual(self.pinned, [False])
+        self.assertTrue(primary_pinned())
+        self.assertFalse(user_wrote_recently(self.user.pk))
+
+    def test_writes_use_primary_and_mark_user(self):
+        middleware = ReplicaRoutingMiddleware(self._get_response)
+        request = self.factory.post('/')
+        request.user = self.user
+
+        middleware(request)
+
+        self.assertEqual(self.pinned, [True])
+        self.assertTrue(user_wrote_recently(self.user.pk))
+
+    def test_reads_after_write_pinned_to_primary(self):
+        key = Token.objects.create(user=self.user).key
+        mark_user_write(self.user.pk)
+
+        token = set_use_primary(False)
+        try:
+            CachedTokenAuthentication().authenticate_credentials(key)
+            self.assertTrue(primary_pinned())
+        finally:
+            reset_use_primary(token)
+
+    def test_reads_without_write_not_pinned(self):
+        key = Token.objects.create(user=self.user).key
+
+        token = set_use_primary(False)
+        try:
+            CachedTokenAuthentication().authenticate_credentials(key)
+            self.assertFalse(primary_pinned())
+        finally:
+            reset_use_primary(token)
+
+    def test_new_token_looked_up_on_primary(self):
+        """Test a token missing on the replica is retried on the primary"""
+        token_obj = Token.objects.create(user=self.user)
+        pinned = []
+
+        def lookup(auth, key):
+            pinned.append(primary_pinned())
+            if not primary_pinned():
+                raise AuthenticationFailed('Invalid token.')
+            return token_obj.user, token_obj
+
+        token = set_use_primary(False)
+        try:
+            with patch.object(
+                    TokenAuthentication, 'authenticate_credentials',
+                    autospec=True, side_effect=lookup):
+                user, _ = CachedTokenAuthentication().authenticate_credentials(
+                    token_obj.key)
+        finally:
+            reset_use_primary(token)
+
+        self.assertEqual(pinned, [False, True])
+        self.assertEqual(user.pk, self.user.pk)
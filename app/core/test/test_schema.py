@@ -0,0 +1,93 @@
+# Test the precomputed OpenAPI schema
+import gzip
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import schema
+
+
+SCHEMA_URL = reverse('api-schema')
+JSON_TYPE = 'application/vnd.oai.openapi+json'
+
+
+class GenerateSchemaTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        settings = override_settings(API_SCHEMA_DIR=self.directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+
+    def _generate(self, *args):
+        out = StringIO()
+        call_command('generate_schema', *args, stdout=out)
+        return out.getvalue()
+
+    def test_generate_writes_every_format(self):
+        out = self._generate()
+
+        self.assertIn('Schema generated', out)
+        directory = Path(self.directory.name)
+        for file_format in schema.RENDERERS:
+            body = (directory / f'schema.{file_format}').read_bytes()
+            self.assertIn(b'/api/recipe/recipes/', body)
+            self.assertEqual(gzip.decompress(
+                (directory / f'schema.{file_format}.gz').read_bytes()), body)
+
+    def test_generate_skipped_when_unchanged(self):
+        self._generate()
+
+        self.assertIn('up to date', self._generate())
+        self.assertIn('Schema generated', self._generate('--force'))
+
+    def test_generate_when_code_changed(self):
+        self._generate()
+
+        with override_settings(SPECTACULAR_SETTINGS={
+                'COMPONENT_SPLIT_REQUEST': True,
+                'TITLE': 'Recipe API'}):
+            self.assertIn('Schema generated', self._generate())
+
+    def test_schema_served_from_file_with_etag(self):
+        self._generate()
+        body = Path(self.directory.name, 'schema.json').read_bytes()
+
+        res = self.client.get(SCHEMA_URL, HTTP_ACCEPT=JSON_TYPE)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.content, body)
+        self.assertTrue(res['Content-Type'].startswith(JSON_TYPE))
+        self.assertIn('Accept-Encoding', res['Vary'])
+
+        res = self.client.get(
+            SCHEMA_URL, HTTP_ACCEPT=JSON_TYPE, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+
+    def test_schema_served_gzipped_when_accepted(self):
+        self._generate()
+        body = Path(self.directory.name, 'schema.yaml').read_bytes()
+
+        res = self.client.get(SCHEMA_URL, HTTP_ACCEPT_ENCODING='gzip, br')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(res.content), body)
+        self.assertTrue(res['ETag'].endswith('-gzip"'))
+
+    def test_schema_built_per_request_without_files(self):
+        res = self.client.get(SCHEMA_URL, HTTP_ACCEPT=JSON_TYPE)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('/api/recipe/recipes/', res.json()['paths'])
+        self.assertNotIn('ETag', res)
@@ -0,0 +1,176 @@
+# Resumable image uploads streamed to disk chunk by chunk
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+
+from core.images import ImageProcessingError, open_image
+from core.jobs import image_target
+from core.models import ChunkedUpload, ImageJob
+
+
+# Bytes read from the request per write, bounds memory per upload
+BLOCK_SIZE = 64 * 1024
+# A chunk still being received after this long lets another request
+# claim its offset, e.g. after the client gave up on it
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+class UploadError(Exception):
+    pass
+
+
+class UploadOffsetError(UploadError):
+    def __init__(self, offset):
+        super().__init__(f'Upload continues at offset {offset}.')
+        self.offset = offset
+
+
+class UploadInProgress(UploadError):
+    pass
+
+
+class UploadTooLarge(UploadError):
+    pass
+
+
+class ChecksumMismatch(UploadError):
+    pass
+
+
+class UploadIncomplete(UploadError):
+    pass
+
+
+def start_upload(user, instance, size):
+    # Reserve an empty file for an upload of `size` bytes
+    upload = ChunkedUpload(
+        user=user,
+        target=image_target(instance),
+        object_id=instance.pk,
+        size=size,
+    )
+    upload.file.save('upload', ContentFile(b''), save=False)
+    upload.save()
+    return upload
+
+
+def _active_upload(user, upload_id):
+    return ChunkedUpload.objects.select_for_update().get(
+        pk=upload_id,
+        user=user,
+        status=ChunkedUpload.ACTIVE,
+    )
+
+
+def _claim(user, upload_id, offset):
+    # Mark the chunk at `offset` as being received in a short transaction
+    now = timezone.now()
+    with transaction.atomic():
+        upload = _active_upload(user, upload_id)
+        if offset != upload.offset:
+            raise UploadOffsetError(upload.offset)
+        if upload.claimed_at is not None \
+                and upload.claimed_at > now - CLAIM_TIMEOUT:
+            raise UploadInProgress(
+                'Another chunk of this upload is being received.')
+        upload.claimed_at = now
+        upload.save(update_fields=['claimed_at'])
+    return upload
+
+
+def _receive(upload, offset, stream, checksum):
+    # Stream the chunk to a part file next to the upload, outside of any
+    # transaction however slow the client is. Returns its path & size.
+    part = tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(upload.file.path),
+        prefix='.part-',
+        delete=False)
+    try:
+        digest = hashlib.sha256()
+        written = 0
+        with part:
+            for block in iter(lambda: stream.read(BLOCK_SIZE), b''):
+                written += len(block)
+                if offset + written > upload.size:
+                    raise UploadTooLarge(
+                        f'Upload is larger than {upload.size} bytes.')
+                digest.update(block)
+                part.write(block)
+        if digest.hexdigest() != checksum.lower():
+            raise ChecksumMismatch('Chunk checksum does not match.')
+    except BaseException:
+        os.unlink(part.name)
+        raise
+    return part.name, written
+
+
+def _commit(upload, offset, part_path, written):
+    # Move the offset on only if this request still holds the claim at
+    # the offset it started from. The update keeps the row locked while
+    # the part file is copied in.
+    with transaction.atomic():
+        moved = ChunkedUpload.objects.filter(
+            pk=upload.pk,
+            status=ChunkedUpload.ACTIVE,
+            offset=offset,
+            claimed_at=upload.claimed_at,
+        ).update(offset=offset + written, claimed_at=None)
+        if not moved:
+            raise UploadOffsetError(ChunkedUpload.objects.values_list(
+                'offset', flat=True).get(pk=upload.pk))
+        with open(part_path, 'rb') as source, \
+                open(upload.file.path, 'r+b') as destination:
+            destination.seek(offset)
+            shutil.copyfileobj(source, destination)
+            destination.truncate()
+    upload.offset = offset + written
+    upload.claimed_at = None
+    return upload
+
+
+def append_chunk(user, upload_id, offset, stream, checksum):
+    # Write a chunk at `offset`, undone if it is too big or corrupted
+    upload = _claim(user, upload_id, offset)
+    try:
+        part_path, written = _receive(upload, offset, stream, checksum)
+    except BaseException:
+        # Let the client retry the offset right away
+        ChunkedUpload.objects.filter(
+            pk=upload.pk,
+            claimed_at=upload.claimed_at,
+        ).update(claimed_at=None)
+        raise
+    try:
+        return _commit(upload, offset, part_path, written)
+    finally:
+        os.unlink(part_path)
+
+
+def finish_upload(user, upload_id):
+    # Queue a fully received upload for processing
+    with transaction.atomic():
+        upload = _active_upload(user, upload_id)
+        if upload.offset != upload.size:
+            raise UploadIncomplete(
+                f'Received {upload.offset} of {upload.size} bytes.')
+        try:
+            with upload.file.open('rb') as image_file:
+                open_image(image_file)
+        except ImageProcessingError as exc:
+            raise UploadError(str(exc)) from exc
+
+        job = ImageJob.objects.create(
+            user=user,
+            target=upload.target,
+            object_id=upload.object_id,
+            source=upload.file.name,
+        )
+        upload.status = ChunkedUpload.COMPLETE
+        upload.save(update_fields=['status'])
+    return job
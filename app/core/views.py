@@ -0,0 +1,107 @@
+# Views for serving uploaded media to its owners
+import mimetypes
+import posixpath
+import re
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+from core.authentication import CachedTokenAuthentication
+from core.images import original_name
+from core.models import Recipe
+from core.schema import schema_files
+
+
+# Upload names are unique, so a file never changes under its URL
+CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+mimetypes.add_type('image/webp', '.webp')
+
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+
+class MediaView(APIView):
+    # Serve a recipe or user image to the user it belongs to
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def _is_owner(self, user, name):
+        name = original_name(name)
+        return get_user_model().objects.filter(pk=user.pk, image=name) \
+            .exists() or Recipe.objects.filter(user=user, image=name).exists()
+
+    @extend_schema(responses={200: OpenApiTypes.BINARY})
+    def get(self, request, name):
+        name = posixpath.normpath(name)
+        if name.startswith(('.', '/')) or not self._is_owner(
+                request.user, name):
+            raise Http404
+
+        content_type = mimetypes.guess_type(name)[0] \
+            or 'application/octet-stream'
+        if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+            # The proxy streams the file from an internal location
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = posixpath.join(
+                settings.MEDIA_ACCEL_REDIRECT_PREFIX, name)
+        else:
+            try:
+                image_file = default_storage.open(name, 'rb')
+            except FileNotFoundError:
+                raise Http404
+            # Sent with the server's file wrapper (sendfile) when available
+            response = FileResponse(image_file, content_type=content_type)
+
+        response['Cache-Control'] = CACHE_CONTROL
+        return response
+
+
+class SchemaView(SpectacularAPIView):
+    # Serve the files written by generate_schema with an ETag & gzipped
+    # when accepted, the schema is only built per request without them
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        files = None if request.GET.get('lang') \
+            else schema_files.get(renderer.format)
+        if files is None:
+            return super().get(request, *args, **kwargs)
+
+        etag, body, gzipped = files
+        gzip_etag = f'{etag[:-1]}-gzip"'
+        use_gzip = bool(ACCEPTS_GZIP.search(
+            request.headers.get('Accept-Encoding', '')))
+        if use_gzip:
+            etag = gzip_etag
+
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            if etag in etags or '*' in etags:
+                response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+                response['ETag'] = etag
+                patch_vary_headers(response, ('Accept-Encoding',))
+                return response
+
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = HttpResponse(
+            gzipped if use_gzip else body, content_type=content_type)
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
@@ -0,0 +1,27 @@
+# Production server settings, read from the environment
+import multiprocessing
+import os
+
+
+# wsgi runs threaded sync workers, asgi runs uvicorn event loop workers
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'app.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'app.wsgi:application'
+    worker_class = 'gthread'
+    # Each thread holds its own persistent database connection
+    threads = int(os.environ.get('SERVER_THREADS', 4))
+
+bind = os.environ.get('SERVER_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get(
+    'SERVER_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+timeout = int(os.environ.get('SERVER_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('SERVER_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('SERVER_KEEPALIVE', 5))
+# Restart workers now & then, so a slow leak can't grow without bound
+max_requests = int(os.environ.get('SERVER_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+accesslog = '-'
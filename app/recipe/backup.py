@@ -0,0 +1,158 @@
+# Export & import a user's recipes as NDJSON or CSV
+import csv
+import io
+import json
+
+from django.db import connections
+from django.db.models import prefetch_related_objects
+
+from core.models import Recipe
+
+from recipe.bulk import bulk_create_recipes
+from recipe.serializers import RecipeDetailSerializer
+
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+FIELDS = [
+    'title',
+    'description',
+    'time_minutes',
+    'price',
+    'link',
+    'tags',
+    'ingredients',
+]
+# Names are one per line inside a CSV cell
+LIST_FIELDS = ('tags', 'ingredients')
+CHUNK_SIZE = 2000
+BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+
+
+def _chunks(queryset, chunk_size):
+    # queryset is ordered by id
+    if connections[queryset.db].settings_dict.get(
+            'DISABLE_SERVER_SIDE_CURSORS'):
+        # Without server-side cursors (pgbouncer) iterator() would fetch
+        # every row at once, so page by id instead
+        last_id = 0
+        while True:
+            chunk = list(queryset.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                return
+            yield chunk
+            last_id = chunk[-1].id
+
+    chunk = []
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(obj)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _export_rows(user, chunk_size):
+    # Lists of exported rows, read through a server-side cursor. iterator()
+    # skips prefetch_related, so tags & ingredients are loaded per chunk.
+    recipes = Recipe.objects.filter(user=user).only(
+        'id', 'title', 'description', 'time_minutes', 'price', 'link',
+    ).order_by('id')
+    for chunk in _chunks(recipes, chunk_size):
+        prefetch_related_objects(chunk, 'tags', 'ingredients')
+        yield [
+            {
+                'title': recipe.title,
+                'description': recipe.description,
+                'time_minutes': recipe.time_minutes,
+                'price': str(recipe.price),
+                'link': recipe.link,
+                'tags': sorted(tag.name for tag in recipe.tags.all()),
+                'ingredients': sorted(
+                    ingredient.name
+                    for ingredient in recipe.ingredients.all()),
+            }
+            for recipe in chunk
+        ]
+
+
+def export_recipes(user, file_format, chunk_size=CHUNK_SIZE):
+    # Yield the export as one string per chunk of recipes, so memory
+    # stays flat however many recipes the user has
+    if file_format == 'ndjson':
+        for rows in _export_rows(user, chunk_size):
+            yield ''.join(json.dumps(row) + '\n' for row in rows)
+        return
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, FIELDS)
+    writer.writeheader()
+    for rows in _export_rows(user, chunk_size):
+        for row in rows:
+            for field in LIST_FIELDS:
+                row[field] = '\n'.join(row[field])
+            writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _import_rows(lines, file_format):
+    # Yield (line number, row) of exported lines, row is None when the
+    # line can't be decoded
+    if file_format == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            for field in LIST_FIELDS:
+                row[field] = (row.get(field) or '').splitlines()
+            yield reader.line_num, row
+        return
+
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def import_recipes(user, lines, file_format, batch_size=BATCH_SIZE):
+    # Create recipes from exported text lines with one transaction per
+    # batch. Invalid rows are skipped & the first errors reported.
+    result = {'created': 0, 'failed': 0, 'errors': []}
+    batch = []
+
+    def flush():
+        result['created'] += len(bulk_create_recipes(user, batch))
+        batch.clear()
+
+    for number, row in _import_rows(lines, file_format):
+        if row is None:
+            errors = {'non_field_errors': ['Invalid line.']}
+        else:
+            for field in LIST_FIELDS:
+                names = row.get(field) or []
+                if isinstance(names, list):
+                    row[field] = [{'name': name} for name in names]
+            serializer = RecipeDetailSerializer(data=row)
+            if serializer.is_valid():
+                batch.append(serializer.validated_data)
+                if len(batch) >= batch_size:
+                    flush()
+                continue
+            errors = serializer.errors
+
+        result['failed'] += 1
+        if len(result['errors']) < MAX_REPORTED_ERRORS:
+            result['errors'].append({'line': number, 'errors': errors})
+
+    if batch:
+        flush()
+    return result
@@ -0,0 +1,108 @@
+# Create, update & delete many recipes of a user in a few statements
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Recipe, Tag, Ingredient
+
+from recipe.cache import bump_user_version
+from recipe.counts import change_recipe_counts
+from recipe.search import update_search_vectors
+from recipe.serializers import get_or_create_attrs
+
+
+# Validated data key, model & through table column of each relation
+RELATIONS = [
+    ('tags', Tag, Recipe.tags.through, 'tag_id'),
+    ('ingredients', Ingredient, Recipe.ingredients.through, 'ingredient_id'),
+]
+
+
+def _fields(data):
+    return {
+        name: value for name, value in data.items()
+        if name not in ('tags', 'ingredients')
+    }
+
+
+def _set_links(user, pairs):
+    # Give each (recipe, data) pair the tags & ingredients of its data,
+    # for the data carrying them, with one lookup, read, delete & insert
+    # per relation. Bulk writes send no m2m_changed, so counts are
+    # adjusted here.
+    for key, model, through, column in RELATIONS:
+        pairs_with = [(recipe, data[key]) for recipe, data in pairs
+                      if key in data]
+        if not pairs_with:
+            continue
+        objs = get_or_create_attrs(model, user, [
+            attr['name'] for _, attrs in pairs_with for attr in attrs
+        ])
+        wanted = {
+            (recipe.pk, objs[attr['name']].pk)
+            for recipe, attrs in pairs_with for attr in attrs
+        }
+        existing = {
+            (recipe_id, attr_id): link_id
+            for link_id, recipe_id, attr_id in through.objects.filter(
+                recipe_id__in=[recipe.pk for recipe, _ in pairs_with],
+            ).values_list('id', 'recipe_id', column)
+        }
+        removed = [link for link in existing if link not in wanted]
+        added = [link for link in wanted if link not in existing]
+
+        if removed:
+            through.objects.filter(
+                id__in=[existing[link] for link in removed]).delete()
+        through.objects.bulk_create([
+            through(recipe_id=recipe_id, **{column: attr_id})
+            for recipe_id, attr_id in added
+        ])
+        change_recipe_counts(
+            model, Counter(attr_id for _, attr_id in added), 1)
+        change_recipe_counts(
+            model, Counter(attr_id for _, attr_id in removed), -1)
+
+
+def _recipes_changed(user, recipe_ids):
+    # What the save signals do for a single recipe
+    update_search_vectors(Recipe.objects.filter(pk__in=recipe_ids))
+    bump_user_version(user.pk)
+
+
+@transaction.atomic
+def bulk_create_recipes(user, items):
+    # Create recipes from validated RecipeDetailSerializer data
+    recipes = Recipe.objects.bulk_create([
+        Recipe(user=user, **_fields(data)) for data in items
+    ])
+    _set_links(user, list(zip(recipes, items)))
+    _recipes_changed(user, [recipe.pk for recipe in recipes])
+    return recipes
+
+
+@transaction.atomic
+def bulk_update_recipes(user, pairs):
+    # Apply validated partial data to (recipe, data) pairs
+    now = timezone.now()
+    fields = {'updated_at'}
+    for recipe, data in pairs:
+        for name, value in _fields(data).items():
+            setattr(recipe, name, value)
+            fields.add(name)
+        recipe.updated_at = now
+
+    recipes = [recipe for recipe, _ in pairs]
+    Recipe.objects.bulk_update(recipes, sorted(fields))
+    _set_links(user, pairs)
+    _recipes_changed(user, [recipe.pk for recipe in recipes])
+    return recipes
+
+
+@transaction.atomic
+def bulk_delete_recipes(user, recipe_ids):
+    # Deleted one query per table, the delete signals still record
+    # tombstones, counts & image references for every recipe
+    Recipe.objects.filter(user=user, pk__in=recipe_ids).delete()
+    return recipe_ids
@@ -0,0 +1,152 @@
+# Response cache & ETags for the recipe APIs keyed on a per-user version
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import parse_etags
+
+from rest_framework import status
+from rest_framework.response import Response
+
+
+STATS_KEYS = {
+    'hits': 'recipe-response-cache:hits',
+    'misses': 'recipe-response-cache:misses',
+}
+
+
+def _cache():
+    return caches[settings.RECIPE_RESPONSE_CACHE_ALIAS]
+
+
+def _version_key(user_id):
+    return f'recipe-version:{user_id}'
+
+
+def get_user_version(user_id):
+    # Current version of the user's recipe data
+    cache = _cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock, so an evicted counter never repeats an
+        # older version that still has cached responses
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(user_id):
+    cache = _cache()
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.add(_version_key(user_id), time.time_ns(), None)
+
+
+def bump_user_version(user_id):
+    # Invalidate every cached response of the user once the write is
+    # committed. A read before the commit sees the old rows & would
+    # cache them under the new version.
+    transaction.on_commit(lambda: _bump(user_id))
+
+
+def _count(stat):
+    cache = _cache()
+    try:
+        cache.incr(STATS_KEYS[stat])
+    except ValueError:
+        cache.add(STATS_KEYS[stat], 0, None)
+        cache.incr(STATS_KEYS[stat])
+
+
+def get_stats():
+    # Hit & miss counters for the response cache
+    values = _cache().get_many(STATS_KEYS.values())
+    return {
+        stat: values.get(key, 0) for stat, key in STATS_KEYS.items()
+    }
+
+
+def reset_stats():
+    _cache().delete_many(STATS_KEYS.values())
+
+
+def response_cache_key(request):
+    # Key on user, version, path & sorted query params
+    user_id = request.user.pk
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    return (
+        f'recipe-response:{user_id}:{get_user_version(user_id)}:'
+        f'{request.get_host()}{request.path}?{params}'
+    )
+
+
+def response_etag(request):
+    # Strong ETag from the same inputs as the cache key, no body needed
+    source = f'{response_cache_key(request)}:{request.accepted_media_type}'
+    return f'"{hashlib.md5(source.encode()).hexdigest()}"'
+
+
+class ConditionalListMixin:
+    # Answer list with 304 when the client's ETag is current
+
+    def _conditional_response(self, handler, request, *args, **kwargs):
+        etag = response_etag(request)
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            # No shortcut for *, it would answer 304 for a missing object
+            if etag in etags:
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+                response['ETag'] = etag
+                return response
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional_response(
+            super().list, request, *args, **kwargs)
+
+
+class ConditionalGetMixin(ConditionalListMixin):
+    # Also answer retrieve with 304, only for viewsets that have one, as
+    # the router adds a GET detail route for any retrieve method
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional_response(
+            super().retrieve, request, *args, **kwargs)
+
+
+class CachedResponseMixin:
+    # Serve list & retrieve from the response cache
+
+    def _cached_response(self, handler, request, *args, **kwargs):
+        cache = _cache()
+        key = response_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            _count('hits')
+            return Response(data)
+
+        _count('misses')
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(
+                key,
+                response.data,
+                settings.RECIPE_RESPONSE_CACHE_TIMEOUT)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(
+            super().retrieve, request, *args, **kwargs)
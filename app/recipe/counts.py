@@ -0,0 +1,75 @@
+# Number of recipes using each tag & ingredient
+from collections import defaultdict
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def _column(attr_model):
+    # Through table column of a tag or ingredient
+    return f'{attr_model._meta.model_name}_id'
+
+
+def added_counts(instance, reverse, pk_set):
+    # {attr id: links added} of a post_add, pk_set only holds new links
+    if reverse:
+        return {instance.pk: len(pk_set)}
+    return {attr_id: 1 for attr_id in pk_set}
+
+
+def linked_counts(through, instance, reverse, attr_model, pk_set=None):
+    # {attr id: links} about to be removed, read before a remove or clear
+    # as pk_set may name rows that are not linked at all
+    column = _column(attr_model)
+    if reverse:
+        links = through.objects.filter(**{column: instance.pk})
+        if pk_set is not None:
+            links = links.filter(recipe_id__in=pk_set)
+        count = links.count()
+        return {instance.pk: count} if count else {}
+
+    links = through.objects.filter(recipe_id=instance.pk)
+    if pk_set is not None:
+        links = links.filter(**{f'{column}__in': pk_set})
+    return {attr_id: 1 for attr_id in links.values_list(column, flat=True)}
+
+
+def change_recipe_counts(attr_model, counts, sign):
+    # Relative updates, so concurrent link changes never overwrite
+    # each other's counts. One UPDATE per distinct amount, also marking
+    # the rows as changed for delta sync.
+    by_amount = defaultdict(list)
+    for attr_id, amount in counts.items():
+        by_amount[amount].append(attr_id)
+    now = timezone.now()
+    for amount, attr_ids in by_amount.items():
+        attr_model.objects.filter(pk__in=attr_ids).update(
+            recipe_count=F('recipe_count') + sign * amount,
+            updated_at=now,
+        )
+
+
+def update_recipe_counts(queryset):
+    # Recount a tag or ingredient queryset from the through table
+    attr_model = queryset.model
+    through = attr_model._meta.get_field('recipe').through
+    column = _column(attr_model)
+    usage = through.objects.filter(
+        **{column: OuterRef('pk')}
+    ).values(column).annotate(count=Count('pk')).values('count')
+    return queryset.update(recipe_count=Coalesce(Subquery(usage), 0))
+
+
+def update_all_recipe_counts(attr_model, batch_size):
+    # Recount every tag or ingredient in id batches, so no statement
+    # locks the whole table. Returns the number of rows recounted.
+    updated = 0
+    last_id = attr_model.objects.order_by('-id').values_list(
+        'id', flat=True).first() or 0
+    for start in range(0, last_id, batch_size):
+        updated += update_recipe_counts(attr_model.objects.filter(
+            id__gt=start,
+            id__lte=start + batch_size,
+        ))
+    return updated
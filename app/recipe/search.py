@@ -0,0 +1,41 @@
+# Full-text search over recipes
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db.models import OuterRef, Subquery
+
+from core.models import Recipe
+
+
+SEARCH_CONFIG = 'english'
+
+
+def _names(through, field_name):
+    # Space separated names linked to the outer recipe
+    return Subquery(
+        through.objects.filter(recipe_id=OuterRef('pk')).values(
+            'recipe_id'
+        ).annotate(
+            names=StringAgg(f'{field_name}__name', ' '),
+        ).values('names')
+    )
+
+
+def search_vector(recipe_model=Recipe):
+    # Weighted vector of a recipe, usable in an UPDATE of the recipe
+    tags = recipe_model._meta.get_field('tags').remote_field.through
+    ingredients = recipe_model._meta.get_field(
+        'ingredients').remote_field.through
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+        + SearchVector(_names(tags, 'tag'), weight='C', config=SEARCH_CONFIG)
+        + SearchVector(
+            _names(ingredients, 'ingredient'),
+            weight='C',
+            config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(recipes):
+    # Recompute the vectors of a recipe queryset in one statement
+    recipes.update(search_vector=search_vector(recipes.model))
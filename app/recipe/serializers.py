@@ -1,6 +1,8 @@
 # Serializers for recipe APIs
+from django.db import transaction
 from rest_framework import serializers
 
+from core.images import ImageUploadMixin, variant_urls
 from core.models import (
     Recipe,
     Tag,
@@ -8,26 +10,83 @@ from core.models import (
     )
 
 
-class TagSerializer(serializers.ModelSerializer):
+def get_or_create_attrs(model, user, names):
+    # Resolve names in bulk & create the missing ones, returns a
+    # name -> object dict
+    names = list(dict.fromkeys(names))
+    if not names:
+        return {}
+    objs = {
+        obj.name: obj for obj in
+        model.objects.filter(user=user, name__in=names)
+    }
+    missing = [name for name in names if name not in objs]
+    if missing:
+        # Rows created concurrently by another request are skipped
+        # here & picked up by the re-read below
+        model.objects.bulk_create(
+            [model(user=user, name=name) for name in missing],
+            ignore_conflicts=True,
+        )
+        objs.update(
+            (obj.name, obj) for obj in
+            model.objects.filter(user=user, name__in=missing)
+        )
+    return objs
+
+
+class UniqueNameMixin:
+    # Names are unique per user, a clash is a 400 not an IntegrityError
+
+    def validate_name(self, value):
+        request = self.context.get('request')
+        # Nested in recipes, existing names are linked instead
+        if request is None or self.parent is not None:
+            return value
+        names = self.Meta.model.objects.filter(user=request.user, name=value)
+        if self.instance is not None:
+            names = names.exclude(pk=self.instance.pk)
+        if names.exists():
+            raise serializers.ValidationError(
+                f'You already have a {self.Meta.model._meta.verbose_name} '
+                f'with this name.')
+        return value
+
+
+class TagSerializer(UniqueNameMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Tag
-        fields = ['id', 'name']
-        read_only_fields = ['id']
+        fields = ['id', 'name', 'recipe_count']
+        read_only_fields = ['id', 'recipe_count']
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(UniqueNameMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Ingredient
+        fields = ['id', 'name', 'recipe_count']
+        read_only_fields = ['id', 'recipe_count']
+
+
+class RecipeTagSerializer(TagSerializer):
+    # Nested in recipes, where counts of just linked tags would be stale
+
+    class Meta(TagSerializer.Meta):
+        fields = ['id', 'name']
+
+
+class RecipeIngredientSerializer(IngredientSerializer):
+
+    class Meta(IngredientSerializer.Meta):
         fields = ['id', 'name']
-        read_only_fields = ['id']
 
 
 class RecipeSerializer(serializers.ModelSerializer):
     # Serializer for recipes
-    tags = TagSerializer(many=True, required=False)
-    ingredients = IngredientSerializer(many=True, required=False)
+    tags = RecipeTagSerializer(many=True, required=False)
+    ingredients = RecipeIngredientSerializer(many=True, required=False)
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -39,45 +98,51 @@ class RecipeSerializer(serializers.ModelSerializer):
             'link',
             'tags',
             'ingredients',
-            'image']
+            'image',
+            'image_variants']
         read_only_fields = ['id']
 
-    def _get_or_create_tags(self, tags, recipe):
-        auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag,
-            )
-            recipe.tags.add(tag_obj)
-
-    def _get_or_create_ingredients(self, ingredients, recipe):
-        auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient,
-            )
-            recipe.ingredients.add(ingredient_obj)
+    def get_image_variants(self, recipe) -> dict:
+        urls = variant_urls(recipe.image)
+        request = self.context.get('request')
+        if urls and request is not None:
+            urls = {
+                variant: request.build_absolute_uri(url)
+                for variant, url in urls.items()
+            }
+        return urls
+
+    def _get_or_create_attrs(self, model, items):
+        names = [item['name'] for item in items]
+        return list(get_or_create_attrs(
+            model, self.context['request'].user, names).values())
+
+    def _get_or_create_tags(self, tags):
+        return self._get_or_create_attrs(Tag, tags)
 
+    def _get_or_create_ingredients(self, ingredients):
+        return self._get_or_create_attrs(Ingredient, ingredients)
+
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags', [])
         ingredients = validated_data.pop('ingredients', [])
         recipe = Recipe.objects.create(**validated_data)
-        self._get_or_create_tags(tags, recipe)
-        self._get_or_create_ingredients(ingredients, recipe)
+        recipe.tags.add(*self._get_or_create_tags(tags))
+        recipe.ingredients.add(*self._get_or_create_ingredients(ingredients))
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
+        # set() only deletes & inserts the through rows that changed
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            instance.tags.set(self._get_or_create_tags(tags))
 
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            instance.ingredients.set(
+                self._get_or_create_ingredients(ingredients))
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
@@ -92,7 +157,46 @@ class RecipeDetailSerializer(RecipeSerializer):
         fields = RecipeSerializer.Meta.fields + ['description']
 
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+class SyncSerializer(serializers.Serializer):
+    # Serializer for changes since a sync token
+    recipes = RecipeDetailSerializer(many=True, read_only=True)
+    tags = TagSerializer(many=True, read_only=True)
+    ingredients = IngredientSerializer(many=True, read_only=True)
+    deleted = serializers.DictField(
+        child=serializers.ListField(child=serializers.IntegerField()),
+        read_only=True,
+    )
+    token = serializers.CharField(read_only=True)
+    next = serializers.URLField(read_only=True, allow_null=True)
+
+
+class BulkResultSerializer(serializers.Serializer):
+    # Outcome of one item of a bulk request
+    status = serializers.IntegerField()
+    id = serializers.IntegerField(required=False)
+    errors = serializers.DictField(required=False)
+
+
+class BulkResultsSerializer(serializers.Serializer):
+    # Results in the order of the request items
+    results = BulkResultSerializer(many=True)
+
+
+class ImportErrorSerializer(serializers.Serializer):
+    line = serializers.IntegerField()
+    errors = serializers.DictField()
+
+
+class ImportResultSerializer(serializers.Serializer):
+    # Outcome of a recipe import, only the first errors are listed
+    created = serializers.IntegerField()
+    failed = serializers.IntegerField()
+    errors = ImportErrorSerializer(many=True)
+
+
+class RecipeImageSerializer(
+        ImageUploadMixin,
+        serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
@@ -0,0 +1,147 @@
+# Keep cached responses, delta sync state, search vectors & usage counts
+# in step with a user's data
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+    Tombstone,
+    )
+
+from recipe.cache import bump_user_version
+from recipe.counts import (
+    added_counts,
+    change_recipe_counts,
+    linked_counts,
+)
+from recipe.search import search_vector, update_search_vectors
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Ingredient)
+def recipe_data_changed(sender, instance, **kwargs):
+    bump_user_version(instance.user_id)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def record_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(
+        user_id=instance.user_id,
+        model=sender._meta.model_name,
+        object_id=instance.pk,
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, update_fields, **kwargs):
+    if update_fields is None or {'title', 'description'} & update_fields:
+        update_search_vectors(Recipe.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def recipe_attr_saved(sender, instance, created, **kwargs):
+    # A renamed tag or ingredient changes the vectors of its recipes
+    if not created:
+        update_search_vectors(instance.recipe_set.all())
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def recipe_attr_deleting(sender, instance, **kwargs):
+    # The links of a deleted tag or ingredient go by cascade, without
+    # m2m_changed, so its recipes are noted before
+    instance._linked_recipe_ids = list(
+        instance.recipe_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def recipe_attr_deleted(sender, instance, **kwargs):
+    # Drop the name from the vectors of the recipes it was linked to
+    Recipe.objects.filter(pk__in=instance._linked_recipe_ids).update(
+        updated_at=timezone.now(),
+        search_vector=search_vector(),
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_links_changed(sender, instance, action, reverse, pk_set,
+                         **kwargs):
+    # instance is a recipe, tag or ingredient depending on the side the
+    # relation was changed from, all of them belong to the same user
+    if action == 'pre_clear' and reverse:
+        # The cleared recipes are unknown once post_clear is sent
+        instance._cleared_recipe_ids = list(
+            instance.recipe_set.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    bump_user_version(instance.user_id)
+    if not reverse:
+        recipes = Recipe.objects.filter(pk=instance.pk)
+    elif action == 'post_clear':
+        recipes = Recipe.objects.filter(pk__in=instance._cleared_recipe_ids)
+    else:
+        recipes = Recipe.objects.filter(pk__in=pk_set)
+    # Linked recipes count as updated for delta sync & search
+    recipes.update(
+        updated_at=timezone.now(),
+        search_vector=search_vector(),
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_links_counted(sender, instance, action, reverse, model, pk_set,
+                         **kwargs):
+    # Keep recipe_count of the linked tags & ingredients current
+    attr_model = instance._meta.concrete_model if reverse else model
+    if action in ('pre_remove', 'pre_clear'):
+        instance._unlinked_counts = linked_counts(
+            sender, instance, reverse, attr_model, pk_set)
+    elif action == 'post_add' and pk_set:
+        change_recipe_counts(
+            attr_model, added_counts(instance, reverse, pk_set), 1)
+    elif action in ('post_remove', 'post_clear'):
+        change_recipe_counts(attr_model, instance._unlinked_counts, -1)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    # The links of a deleted recipe go without m2m_changed
+    instance._unlinked_counts = {
+        Tag: linked_counts(Recipe.tags.through, instance, False, Tag),
+        Ingredient: linked_counts(
+            Recipe.ingredients.through, instance, False, Ingredient),
+    }
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    for attr_model, counts in instance._unlinked_counts.items():
+        change_recipe_counts(attr_model, counts, -1)
+
+
+@receiver(post_save, sender=get_user_model())
+def user_created(sender, instance, created, **kwargs):
+    # Never serve responses cached for a reused user ID
+    if created:
+        bump_user_version(instance.pk)
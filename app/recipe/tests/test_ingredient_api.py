@@ -16,6 +16,7 @@ from recipe.serializers import IngredientSerializer
 
 
 INGREDIENTS_URL = reverse('recipe:ingredient-list')
+INGREDIENTS_AUTOCOMPLETE_URL = reverse('recipe:ingredient-autocomplete')
 
 
 def detail_url(ingredient_id):
@@ -54,7 +55,7 @@ class PrivateIngredientsAPITest(TestCase):
         ingredients = Ingredient.objects.all().order_by('-name')
         serializer = IngredientSerializer(ingredients, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_ingredients_limited_to_user(self):
         anotherUser = create_user(email='user2@example.com')
@@ -67,9 +68,9 @@ class PrivateIngredientsAPITest(TestCase):
         res = self.client.get(INGREDIENTS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], ingredient.name)
-        self.assertEqual(res.data[0]['id'], ingredient.id)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], ingredient.name)
+        self.assertEqual(res.data['results'][0]['id'], ingredient.id)
 
     def test_update_ingredient(self):
         ingredient = Ingredient.objects.create(user=self.user, name='Meet')
@@ -83,6 +84,30 @@ class PrivateIngredientsAPITest(TestCase):
         ingredient.refresh_from_db()
         self.assertEqual(ingredient.name, payload['name'])
 
+    def test_rename_ingredient_to_existing_name_rejected(self):
+        Ingredient.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Meet')
+        other_user = create_user(email='other@example.com')
+        Ingredient.objects.create(user=other_user, name='Dessert')
+
+        res = self.client.patch(detail_url(ingredient.id), {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('name', res.data)
+        ingredient.refresh_from_db()
+        self.assertEqual(ingredient.name, 'Meet')
+
+        res = self.client.patch(detail_url(ingredient.id), {'name': 'Dessert'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_get_ingredient_detail_not_allowed(self):
+        ingredient = Ingredient.objects.create(user=self.user, name='Meet')
+
+        res = self.client.get(detail_url(ingredient.id))
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
     def test_delete_ingredient(self):
         ingredient = Ingredient.objects.create(user=self.user, name='Meet')
         url = detail_url(ingredient.id)
@@ -102,12 +127,13 @@ class PrivateIngredientsAPITest(TestCase):
             user=self.user,
         )
         recipe.ingredients.add(in1)
+        in1.refresh_from_db()
         res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
         s1 = IngredientSerializer(in1)
         s2 = IngredientSerializer(in2)
-        self.assertIn(s1.data, res.data)
-        self.assertNotIn(s2.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertNotIn(s2.data, res.data['results'])
 
     def test_filterd_ingredients_unique(self):
         ing = Ingredient.objects.create(user=self.user, name='Ingredient 1')
@@ -128,4 +154,22 @@ class PrivateIngredientsAPITest(TestCase):
         recipe2.ingredients.add(ing)
         res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_autocomplete_ordered_by_usage(self):
+        ing1 = Ingredient.objects.create(user=self.user, name='Salt')
+        ing2 = Ingredient.objects.create(user=self.user, name='Salmon')
+        Ingredient.objects.create(user=self.user, name='Sugar')
+        recipe = Recipe.objects.create(
+            title='Recipe',
+            time_minutes=5,
+            price=Decimal('4.50'),
+            user=self.user,
+        )
+        recipe.ingredients.add(ing2)
+
+        res = self.client.get(INGREDIENTS_AUTOCOMPLETE_URL, {'q': 'sal'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [ing['id'] for ing in res.data], [ing2.id, ing1.id])
@@ -1,23 +1,34 @@
 # Test for recipe api
+import json
 import tempfile
 import os
 from decimal import Decimal
+from io import BytesIO, StringIO
 
 from PIL import Image
 
 from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from core.blobs import store_image
+from core.images import delete_variants, process_image, variant_name
 from core.models import (
     Recipe,
     Tag,
-    Ingredient
+    Ingredient,
+    ImageBlob,
+    ImageJob,
     )
 
+from recipe import cache
 from recipe.serializers import (
     RecipeSerializer,
     RecipeDetailSerializer,
@@ -25,6 +36,9 @@ from recipe.serializers import (
 
 
 RECIPES_URL = reverse('recipe:recipe-list')
+BULK_URL = reverse('recipe:recipe-bulk')
+EXPORT_URL = reverse('recipe:recipe-export')
+IMPORT_URL = reverse('recipe:recipe-import')
 
 
 def detail_url(recipe_id):
@@ -71,6 +85,8 @@ class PrivteRecipeAPITest(TestCase):
     # Test authenticated API requests
 
     def setUp(self):
+        # Tests never commit, so versions are never bumped between them
+        caches['default'].clear()
         self.client = APIClient()
         self.user = create_user(
             email='test@example.com',
@@ -87,7 +103,7 @@ class PrivteRecipeAPITest(TestCase):
         recipes = Recipe.objects.all().order_by('-id')
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipe_list_limited_to_user(self):
         # Test list of recipes is limited to auth user
@@ -102,7 +118,47 @@ class PrivteRecipeAPITest(TestCase):
         recipes = Recipe.objects.filter(user=self.user)
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
+
+    def test_list_recipes_query_count_constant(self):
+        # Test listing recipes does not query tags/ingredients per recipe
+        def create_recipes(count):
+            for i in range(count):
+                recipe = create_recipe(user=self.user, title=f'Recipe {i}')
+                recipe.tags.add(Tag.objects.create(
+                    user=self.user,
+                    name=f'Tag {recipe.id}'))
+                recipe.ingredients.add(Ingredient.objects.create(
+                    user=self.user,
+                    name=f'Ingredient {recipe.id}'))
+
+        create_recipes(2)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(RECIPES_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipes(8)
+        with CaptureQueriesContext(connection) as many:
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(few), len(many))
+
+    def test_recipes_paginated_by_cursor(self):
+        # Test recipes are returned in pages following the next cursor
+        recipes = [
+            create_recipe(user=self.user, title=f'Recipe {i}')
+            for i in range(5)
+        ]
+
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+        ids = [recipe['id'] for recipe in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            ids += [recipe['id'] for recipe in res.data['results']]
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(ids, [recipe.id for recipe in reversed(recipes)])
 
     def test_get_recipe_detail(self):
         # Test get recipe detail
@@ -251,6 +307,39 @@ class PrivteRecipeAPITest(TestCase):
             ).exists()
             self.assertTrue(exists)
 
+    def test_creating_recipe_with_duplicate_tag_names(self):
+        payload = {
+            'title': 'Recipe Title example',
+            'time_minutes': 30,
+            'price': Decimal(2.55),
+            'tags': [{'name': 'Lunch'}, {'name': 'Lunch'}]
+        }
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.tags.count(), 1)
+        self.assertEqual(
+            Tag.objects.filter(user=self.user, name='Lunch').count(), 1)
+
+    def test_create_recipe_query_count_constant(self):
+        # Test nested ingredients are resolved in bulk
+        def post_recipe(count):
+            payload = {
+                'title': f'Recipe with {count} ingredients',
+                'time_minutes': 30,
+                'price': Decimal('2.55'),
+                'ingredients': [
+                    {'name': f'Ingredient {count}-{i}'} for i in range(count)
+                ]
+            }
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.post(RECIPES_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+
+        self.assertEqual(post_recipe(2), post_recipe(30))
+
     def test_create_tag_on_update_recipe(self):
         recipe = create_recipe(user=self.user)
         payload = {'tags': [{'name': 'Lunch'}]}
@@ -275,6 +364,27 @@ class PrivteRecipeAPITest(TestCase):
         self.assertIn(tag_2, recipe.tags.all())
         self.assertNotIn(tag_1, recipe.tags.all())
 
+    def test_update_recipe_keeps_unchanged_tags(self):
+        # Test only changed tag links are rewritten on update
+        tag_1 = Tag.objects.create(user=self.user, name='Tag 1')
+        tag_2 = Tag.objects.create(user=self.user, name='Tag 2')
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag_1, tag_2)
+        kept_link = Recipe.tags.through.objects.get(
+            recipe=recipe,
+            tag=tag_1)
+
+        payload = {'tags': [{'name': 'Tag 1'}, {'name': 'Tag 3'}]}
+        url = detail_url(recipe.id)
+        res = self.client.patch(url, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        links = Recipe.tags.through.objects.filter(recipe=recipe)
+        self.assertIn(kept_link, links)
+        self.assertEqual(
+            sorted(links.values_list('tag__name', flat=True)),
+            ['Tag 1', 'Tag 3'])
+
     def test_clear_recipe_tags(self):
         tag = Tag.objects.create(user=self.user, name='Test tag')
         recipe = create_recipe(user=self.user)
@@ -398,9 +508,36 @@ class PrivteRecipeAPITest(TestCase):
         s1 = RecipeSerializer(r1)
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
+
+    def test_filter_by_all_tags(self):
+        r1 = create_recipe(user=self.user, title='recipe 1')
+        r2 = create_recipe(user=self.user, title='recipe 2')
+        tag1 = Tag.objects.create(user=self.user, name='Tag 1')
+        tag2 = Tag.objects.create(user=self.user, name='Tag 2')
+        r1.tags.add(tag1, tag2)
+        r2.tags.add(tag1)
+
+        params = {'tags': f'{tag1.id},{tag2.id}', 'match': 'all'}
+        res = self.client.get(RECIPES_URL, params)
+
+        s1 = RecipeSerializer(r1)
+        s2 = RecipeSerializer(r2)
+        self.assertEqual(res.data['results'], [s1.data])
+        self.assertNotIn(s2.data, res.data['results'])
+
+    def test_filter_by_tags_returns_recipe_once(self):
+        recipe = create_recipe(user=self.user)
+        tag1 = Tag.objects.create(user=self.user, name='Tag 1')
+        tag2 = Tag.objects.create(user=self.user, name='Tag 2')
+        recipe.tags.add(tag1, tag2)
+
+        params = {'tags': f'{tag1.id},{tag2.id}'}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(len(res.data['results']), 1)
 
     def test_filter_by_ingredients(self):
         r1 = create_recipe(user=self.user, title='recipe 1')
@@ -421,9 +558,568 @@ class PrivteRecipeAPITest(TestCase):
         s1 = RecipeSerializer(r1)
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
+
+
+class RecipeRangeFilterTest(TestCase):
+    # Test time & price filters and sorting of recipes
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+
+    def _ids(self, res):
+        return [recipe['id'] for recipe in res.data['results']]
+
+    def test_filter_by_max_time(self):
+        r1 = create_recipe(user=self.user, time_minutes=10)
+        r2 = create_recipe(user=self.user, time_minutes=30)
+        create_recipe(user=self.user, time_minutes=31)
+
+        res = self.client.get(RECIPES_URL, {'max_time': 30})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._ids(res), [r2.id, r1.id])
+
+    def test_filter_by_price_range(self):
+        create_recipe(user=self.user, price=Decimal('2.99'))
+        r2 = create_recipe(user=self.user, price=Decimal('3.00'))
+        r3 = create_recipe(user=self.user, price=Decimal('7.50'))
+        create_recipe(user=self.user, price=Decimal('7.51'))
+
+        params = {'min_price': '3', 'max_price': '7.50'}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(self._ids(res), [r3.id, r2.id])
+
+    def test_invalid_range_returns_error(self):
+        for params in (
+                {'max_time': 'soon'},
+                {'min_price': 'cheap'},
+                {'max_price': 'NaN'}):
+            res = self.client.get(RECIPES_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_ordering(self):
+        r1 = create_recipe(
+            user=self.user, time_minutes=20, price=Decimal('9'))
+        r2 = create_recipe(
+            user=self.user, time_minutes=5, price=Decimal('1'))
+        r3 = create_recipe(
+            user=self.user, time_minutes=20, price=Decimal('4'))
+
+        res = self.client.get(RECIPES_URL, {'ordering': 'time_minutes'})
+        self.assertEqual(self._ids(res), [r2.id, r1.id, r3.id])
+
+        res = self.client.get(RECIPES_URL, {'ordering': '-time_minutes'})
+        self.assertEqual(self._ids(res), [r3.id, r1.id, r2.id])
+
+        res = self.client.get(RECIPES_URL, {'ordering': '-price'})
+        self.assertEqual(self._ids(res), [r1.id, r3.id, r2.id])
+
+    def test_invalid_ordering_returns_error(self):
+        res = self.client.get(RECIPES_URL, {'ordering': 'user'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sorted_pages_use_keyset(self):
+        # Ties on the sort field are paged by id, never with OFFSET
+        recipes = [
+            create_recipe(user=self.user, time_minutes=minutes)
+            for minutes in (5, 10, 10, 10, 10, 20, 5)
+        ]
+        expected = [
+            recipe.id for recipe in
+            sorted(recipes, key=lambda r: (r.time_minutes, r.id))
+        ]
+
+        ids = []
+        params = {'ordering': 'time_minutes', 'page_size': 2}
+        res = self.client.get(RECIPES_URL, params)
+        ids += self._ids(res)
+        while res.data['next']:
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.get(res.data['next'])
+            ids += self._ids(res)
+            for query in queries.captured_queries:
+                self.assertNotIn('OFFSET', query['sql'])
+        self.assertEqual(ids, expected)
+
+        # And back again through the previous links
+        ids = self._ids(res)
+        while res.data['previous']:
+            res = self.client.get(res.data['previous'])
+            ids = self._ids(res) + ids
+        self.assertEqual(ids, expected)
+
+    def test_cursor_from_other_ordering_rejected(self):
+        for minutes in (5, 10, 20):
+            create_recipe(user=self.user, time_minutes=minutes)
+        res = self.client.get(
+            RECIPES_URL, {'ordering': 'time_minutes', 'page_size': 1})
+
+        url = res.data['next'].replace('ordering=time_minutes', 'ordering=id')
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RecipeBulkAPITest(TestCase):
+    # Test bulk create, update & delete of recipes
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+
+    def _payload(self, title, **params):
+        payload = {
+            'title': title,
+            'time_minutes': 10,
+            'price': '2.50',
+            'tags': [{'name': 'Dinner'}],
+            'ingredients': [{'name': 'Salt'}],
+        }
+        payload.update(params)
+        return payload
+
+    def test_bulk_create(self):
+        Tag.objects.create(user=self.user, name='Dinner')
+        payload = [
+            self._payload('Soup'),
+            self._payload('Stew', tags=[{'name': 'Dinner'}, {'name': 'Hot'}]),
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        ids = [result['id'] for result in res.data['results']]
+        recipes = Recipe.objects.filter(user=self.user).order_by('id')
+        self.assertEqual([recipe.id for recipe in recipes], ids)
+        self.assertEqual(
+            [recipe.title for recipe in recipes], ['Soup', 'Stew'])
+        self.assertEqual(
+            sorted(recipes[1].tags.values_list('name', flat=True)),
+            ['Dinner', 'Hot'])
+        self.assertEqual(
+            Tag.objects.get(user=self.user, name='Dinner').recipe_count, 2)
+        self.assertEqual(
+            Ingredient.objects.get(user=self.user, name='Salt').recipe_count,
+            2)
+        # Not one round of queries per recipe
+        self.assertLess(len(queries), 25)
+
+    def test_bulk_create_atomic_writes_nothing_on_error(self):
+        payload = [self._payload('Soup'), self._payload('')]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        results = res.data['results']
+        self.assertEqual(
+            results[0]['status'], status.HTTP_424_FAILED_DEPENDENCY)
+        self.assertEqual(results[1]['status'], status.HTTP_400_BAD_REQUEST)
+        self.assertIn('title', results[1]['errors'])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_create_best_effort(self):
+        payload = [self._payload(''), self._payload('Soup')]
+
+        res = self.client.post(
+            f'{BULK_URL}?mode=best_effort', payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        results = res.data['results']
+        self.assertEqual(results[0]['status'], status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(results[1]['status'], status.HTTP_201_CREATED)
+        self.assertEqual(
+            list(Recipe.objects.values_list('title', flat=True)), ['Soup'])
+
+    def test_bulk_update(self):
+        r1 = create_recipe(user=self.user, title='Soup')
+        r2 = create_recipe(user=self.user, title='Stew')
+        old_tag = Tag.objects.create(user=self.user, name='Lunch')
+        r1.tags.add(old_tag)
+        payload = [
+            {'id': r1.id, 'tags': [{'name': 'Dinner'}]},
+            {'id': r2.id, 'title': 'Beef stew', 'price': '9.00'},
+        ]
+
+        res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        r1.refresh_from_db()
+        r2.refresh_from_db()
+        old_tag.refresh_from_db()
+        self.assertEqual(r1.title, 'Soup')
+        self.assertEqual(
+            list(r1.tags.values_list('name', flat=True)), ['Dinner'])
+        self.assertEqual(r2.title, 'Beef stew')
+        self.assertEqual(r2.price, Decimal('9.00'))
+        self.assertEqual(old_tag.recipe_count, 0)
+
+    def test_bulk_update_other_users_recipe_not_found(self):
+        other = create_user(email='other@example.com', password='test123')
+        recipe = create_recipe(user=other, title='Soup')
+        own = create_recipe(user=self.user, title='Stew')
+        payload = [
+            {'id': own.id, 'title': 'Beef stew'},
+            {'id': recipe.id, 'title': 'Mine now'},
+            {'title': 'No id'},
+        ]
+
+        res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        statuses = [result['status'] for result in res.data['results']]
+        self.assertEqual(statuses, [
+            status.HTTP_424_FAILED_DEPENDENCY,
+            status.HTTP_404_NOT_FOUND,
+            status.HTTP_400_BAD_REQUEST,
+        ])
+        recipe.refresh_from_db()
+        own.refresh_from_db()
+        self.assertEqual(recipe.title, 'Soup')
+        self.assertEqual(own.title, 'Stew')
+
+    def test_bulk_delete(self):
+        r1 = create_recipe(user=self.user)
+        r2 = create_recipe(user=self.user)
+        r3 = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        r1.tags.add(tag)
+        r3.tags.add(tag)
+
+        res = self.client.delete(
+            f'{BULK_URL}?mode=best_effort',
+            [r1.id, r2.id, r2.id, 0],
+            format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        statuses = [result['status'] for result in res.data['results']]
+        self.assertEqual(statuses, [
+            status.HTTP_204_NO_CONTENT,
+            status.HTTP_204_NO_CONTENT,
+            status.HTTP_400_BAD_REQUEST,
+            status.HTTP_404_NOT_FOUND,
+        ])
+        self.assertEqual(list(Recipe.objects.all()), [r3])
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 1)
+
+    def test_bulk_requires_list(self):
+        res = self.client.post(
+            BULK_URL, self._payload('Soup'), format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeExportImportTest(TestCase):
+    # Test streaming export & import of a user's recipes
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+
+    def _export(self, **params):
+        res = self.client.get(EXPORT_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return b''.join(res.streaming_content).decode()
+
+    def _create_recipes(self):
+        r1 = create_recipe(user=self.user, title='Soup')
+        r1.tags.add(Tag.objects.create(user=self.user, name='Dinner'))
+        r1.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Salt'),
+            Ingredient.objects.create(user=self.user, name='Leek'))
+        create_recipe(user=self.user, title='Stew', description='')
+        other = create_user(email='other@example.com', password='test123')
+        create_recipe(user=other, title='Not mine')
+
+    def test_export_ndjson(self):
+        self._create_recipes()
+
+        rows = [json.loads(line) for line in self._export().splitlines()]
+
+        self.assertEqual([row['title'] for row in rows], ['Soup', 'Stew'])
+        self.assertEqual(rows[0]['tags'], ['Dinner'])
+        self.assertEqual(rows[0]['ingredients'], ['Leek', 'Salt'])
+        self.assertEqual(rows[0]['price'], '5.50')
+
+    def test_export_csv(self):
+        self._create_recipes()
+
+        content = self._export(file_format='csv')
+
+        self.assertTrue(content.startswith('title,description,'))
+        self.assertIn('"Leek\nSalt"', content)
+
+    def test_export_invalid_format(self):
+        res = self.client.get(EXPORT_URL, {'file_format': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_round_trip(self):
+        self._create_recipes()
+        exports = [
+            (self._export(file_format='ndjson'), 'application/x-ndjson'),
+            (self._export(file_format='csv'), 'text/csv'),
+        ]
+        for content, content_type in exports:
+            res = self.client.post(
+                IMPORT_URL, content.encode(), content_type=content_type)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res.data['created'], 2)
+        soups = Recipe.objects.filter(user=self.user, title='Soup')
+        self.assertEqual(soups.count(), 3)
+        self.assertEqual(
+            sorted(soups.last().ingredients.values_list('name', flat=True)),
+            ['Leek', 'Salt'])
+        self.assertEqual(
+            Tag.objects.get(user=self.user, name='Dinner').recipe_count, 3)
+
+    def test_import_reports_invalid_lines(self):
+        lines = [
+            json.dumps({'title': 'Soup', 'time_minutes': 5, 'price': '1'}),
+            'not json',
+            json.dumps({'title': 'No price', 'time_minutes': 5}),
+        ]
+
+        res = self.client.post(
+            IMPORT_URL,
+            '\n'.join(lines).encode(),
+            content_type='application/x-ndjson')
+
+        self.assertEqual(res.data['created'], 1)
+        self.assertEqual(res.data['failed'], 2)
+        self.assertEqual(
+            [error['line'] for error in res.data['errors']], [2, 3])
+        self.assertIn('price', res.data['errors'][1]['errors'])
+
+
+class RecipeSearchTest(TestCase):
+    # Test full-text search over recipes
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+
+    def test_search_ranks_title_matches_first(self):
+        r1 = create_recipe(
+            user=self.user,
+            title='Pasta salad',
+            description='Cold noodles with curry dressing')
+        r2 = create_recipe(
+            user=self.user,
+            title='Thai curry',
+            description='Spicy and quick')
+        create_recipe(user=self.user, title='Pancakes', description='Sweet')
+
+        res = self.client.get(RECIPES_URL, {'search': 'curry'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids, [r2.id, r1.id])
+
+    def test_search_matches_tags_and_ingredients(self):
+        r1 = create_recipe(user=self.user, title='Soup')
+        r2 = create_recipe(user=self.user, title='Stew')
+        r1.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        r2.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Lentils'))
+
+        res = self.client.get(RECIPES_URL, {'search': 'vegan'})
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']], [r1.id])
+
+        res = self.client.get(RECIPES_URL, {'search': 'lentil'})
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']], [r2.id])
+
+    def test_search_follows_tag_rename(self):
+        recipe = create_recipe(user=self.user, title='Soup')
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+
+        tag.name = 'Spicy'
+        tag.save()
+
+        res = self.client.get(RECIPES_URL, {'search': 'spicy'})
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']], [recipe.id])
+
+    def test_search_forgets_deleted_tag(self):
+        recipe = create_recipe(user=self.user, title='Soup')
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+
+        tag.delete()
+
+        res = self.client.get(RECIPES_URL, {'search': 'vegan'})
+        self.assertEqual(res.data['results'], [])
+
+    def test_search_combined_with_tags_filter(self):
+        r1 = create_recipe(user=self.user, title='Chicken curry')
+        create_recipe(user=self.user, title='Beef curry')
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        r1.tags.add(tag)
+
+        params = {'search': 'curry', 'tags': f'{tag.id}'}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']], [r1.id])
+
+    def test_search_pages_each_match_once(self):
+        # Tied & untied ranks, over several pages
+        recipes = [
+            create_recipe(user=self.user, title=f'Chicken dish {i}')
+            for i in range(5)
+        ] + [
+            create_recipe(
+                user=self.user,
+                title=f'Dish {i}',
+                description='Chicken, rice & more chicken')
+            for i in range(4)
+        ]
+
+        res = self.client.get(
+            RECIPES_URL, {'search': 'chicken', 'page_size': 2})
+        ids = [recipe['id'] for recipe in res.data['results']]
+        while res.data['next'] and len(ids) <= len(recipes):
+            res = self.client.get(res.data['next'])
+            ids += [recipe['id'] for recipe in res.data['results']]
+
+        self.assertEqual(
+            sorted(ids), sorted(recipe.id for recipe in recipes))
+
+    def test_search_limited_to_user(self):
+        other = create_user(email='other@example.com', password='test123')
+        create_recipe(user=other, title='Thai curry')
+
+        res = self.client.get(RECIPES_URL, {'search': 'curry'})
+
+        self.assertEqual(res.data['results'], [])
+
+
+class RecipeResponseCacheTest(TestCase):
+    # Test cached recipe list & detail responses
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email='test@example.com',
+            password='testpass123')
+        self.client.force_authenticate(self.user)
+        caches['default'].clear()
+
+    def test_list_served_from_cache(self):
+        create_recipe(user=self.user)
+        first = self.client.get(RECIPES_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, first.data)
+        self.assertEqual(cache.get_stats(), {'hits': 1, 'misses': 1})
+
+    def test_query_params_normalized(self):
+        self.client.get(RECIPES_URL, {'page_size': 5, 'match': 'all'})
+        self.client.get(RECIPES_URL, {'match': 'all', 'page_size': 5})
+
+        self.assertEqual(cache.get_stats(), {'hits': 1, 'misses': 1})
+
+    def test_write_invalidates_cache(self):
+        recipe = create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+        self.client.get(detail_url(recipe.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(detail_url(recipe.id), {'title': 'New title'})
+            tag = Tag.objects.create(user=self.user, name='Tag 1')
+            recipe.tags.add(tag)
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data['results'][0]['title'], 'New title')
+        self.assertEqual(res.data['results'][0]['tags'][0]['id'], tag.id)
+        res = self.client.get(detail_url(recipe.id))
+        self.assertEqual(res.data['title'], 'New title')
+        self.assertEqual(cache.get_stats()['hits'], 0)
+
+    def test_cache_limited_to_user(self):
+        create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+        other_user = create_user(
+            email='user2@example.com',
+            password='testpass123')
+        self.client.force_authenticate(other_user)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.data['results'], [])
+
+    def test_version_bumped_after_commit(self):
+        """Test reads before a write commits keep the old version"""
+        recipe = create_recipe(user=self.user)
+        version = cache.get_user_version(self.user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.title = 'New title'
+            recipe.save()
+            # A concurrent read now still sees the old row, what it
+            # caches must stay under the old version
+            self.assertEqual(cache.get_user_version(self.user.pk), version)
+
+        self.assertNotEqual(cache.get_user_version(self.user.pk), version)
+
+
+class RecipeConditionalGetTest(TestCase):
+    # Test ETag support on recipe endpoints
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client = APIClient()
+        self.user = create_user(
+            email='test@example.com',
+            password='testpass123')
+        self.client.force_authenticate(self.user)
+
+    def test_matching_etag_not_modified(self):
+        recipe = create_recipe(user=self.user)
+        for url in [RECIPES_URL, detail_url(recipe.id)]:
+            res = self.client.get(url)
+            etag = res['ETag']
+
+            with self.assertNumQueries(0):
+                res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+            self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(res['ETag'], etag)
+
+    def test_wildcard_etag_for_missing_recipe_not_found(self):
+        res = self.client.get(detail_url(999999), HTTP_IF_NONE_MATCH='*')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_etag_changes_after_write(self):
+        recipe = create_recipe(user=self.user)
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.title = 'New title'
+            recipe.save()
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
 
 
 class ImageUploadTest(TestCase):
@@ -437,6 +1133,8 @@ class ImageUploadTest(TestCase):
         self.recipe = create_recipe(user=self.user)
 
     def tearDown(self):
+        self.recipe.refresh_from_db()
+        delete_variants(self.recipe.image)
         self.recipe.image.delete()
 
     def test_upload_image(self):
@@ -447,11 +1145,20 @@ class ImageUploadTest(TestCase):
             image_file.seek(0)
             payload = {'image': image_file}
             res = self.client.post(url, payload, format='multipart')
-            self.recipe.refresh_from_db()
 
-            self.assertEqual(res.status_code, status.HTTP_200_OK)
-            self.assertIn('image', res.data)
-            self.assertTrue(os.path.exists(self.recipe.image.path))
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['status'], ImageJob.PENDING)
+        self.assertFalse(self.recipe.image)
+
+        call_command('run_image_worker', '--once', stdout=StringIO())
+        self.recipe.refresh_from_db()
+        job = ImageJob.objects.get(id=res.data['id'])
+
+        self.assertEqual(job.status, ImageJob.DONE)
+        self.assertFalse(job.source)
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+        res = self.client.get(res.data['status_url'])
+        self.assertEqual(res.data['status'], ImageJob.DONE)
 
     def test_upload_image_bad_request(self):
         url = image_upload_url(self.recipe.id)
@@ -459,3 +1166,109 @@ class ImageUploadTest(TestCase):
         res = self.client.post(url, payload, format='multipart')
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_image_creates_variants(self):
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            img = Image.new('RGB', (3000, 1500))
+            exif = Image.Exif()
+            exif[0x010f] = 'Camera maker'
+            img.save(image_file, format='JPEG', exif=exif)
+            image_file.seek(0)
+            res = self.client.post(
+                url,
+                {'image': image_file},
+                format='multipart')
+        call_command('run_image_worker', '--once', stdout=StringIO())
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.image.name.endswith('.webp'))
+        expected_sizes = {
+            'thumbnail': (256, 128),
+            'medium': (1024, 512),
+            'original': (2048, 1024),
+        }
+        for variant, size in expected_sizes.items():
+            path = variant_name(self.recipe.image.path, variant)
+            with Image.open(path) as variant_img:
+                self.assertEqual(variant_img.format, 'WEBP')
+                self.assertEqual(variant_img.size, size)
+                self.assertNotIn('exif', variant_img.info)
+
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertTrue(
+            res.data['image_variants']['thumbnail'].endswith(
+                '_thumbnail.webp'))
+
+    def test_upload_image_too_large(self):
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.png') as image_file:
+            img = Image.new('RGB', (8001, 1))
+            img.save(image_file, format='PNG')
+            image_file.seek(0)
+            res = self.client.post(
+                url,
+                {'image': image_file},
+                format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_identical_uploads_share_image(self):
+        other_recipe = create_recipe(user=self.user)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (10, 10)).save(image_file, format='JPEG')
+            for recipe in [self.recipe, other_recipe]:
+                image_file.seek(0)
+                self.client.post(
+                    image_upload_url(recipe.id),
+                    {'image': image_file},
+                    format='multipart')
+        call_command('run_image_worker', '--once', stdout=StringIO())
+
+        self.recipe.refresh_from_db()
+        other_recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image.name, other_recipe.image.name)
+        blob = ImageBlob.objects.get(name=self.recipe.image.name)
+        self.assertEqual(blob.ref_count, 2)
+
+        other_recipe.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+
+    def test_same_image_again_keeps_one_reference(self):
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (10, 10)).save(image_file, format='JPEG')
+            for _ in range(2):
+                image_file.seek(0)
+                self.client.post(
+                    image_upload_url(self.recipe.id),
+                    {'image': image_file},
+                    format='multipart')
+                call_command(
+                    'run_image_worker', '--once', stdout=StringIO())
+
+        self.recipe.refresh_from_db()
+        blob = ImageBlob.objects.get(name=self.recipe.image.name)
+        self.assertEqual(blob.ref_count, 1)
+
+    def test_stored_image_releases_current_not_stale_image(self):
+        """Test the replaced image is read from the locked row"""
+        stale = Recipe.objects.get(id=self.recipe.id)
+        variants = []
+        for color in ['red', 'blue']:
+            image_file = BytesIO()
+            Image.new('RGB', (10, 10), color).save(image_file, format='JPEG')
+            image_file.seek(0)
+            variants.append(process_image(image_file))
+        store_image(self.recipe, variants[0])
+        first_blob = ImageBlob.objects.get(name=self.recipe.image.name)
+        self.addCleanup(delete_variants, self.recipe.image)
+        self.addCleanup(self.recipe.image.delete, save=False)
+
+        store_image(stale, variants[1])
+
+        first_blob.refresh_from_db()
+        self.assertEqual(first_blob.ref_count, 0)
+        self.assertEqual(
+            ImageBlob.objects.get(name=stale.image.name).ref_count, 1)
@@ -0,0 +1,187 @@
+# Test for delta sync api
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+    )
+
+
+SYNC_URL = reverse('recipe:sync')
+
+
+def create_recipe(user, **params):
+    defaults = {
+        'title': 'Sample recipe title',
+        'time_minutes': 22,
+        'price': Decimal('5.5'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def create_user(email='user@example.com', password='testpass123'):
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+class PublicSyncAPITest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_auth_required(self):
+        res = self.client.get(SYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(SYNC_TOKEN_LAG_SECONDS=0)
+class PrivateSyncAPITest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+    def test_full_sync(self):
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        create_recipe(user=create_user(email='user2@example.com'))
+
+        res = self.client.get(SYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['id'] for r in res.data['recipes']], [recipe.id])
+        self.assertEqual([t['id'] for t in res.data['tags']], [tag.id])
+        self.assertEqual(res.data['ingredients'], [])
+        self.assertIn('token', res.data)
+
+    @override_settings(SYNC_PAGE_SIZE=2)
+    def test_full_sync_paged(self):
+        recipes = [create_recipe(user=self.user) for _ in range(5)]
+        tags = [
+            Tag.objects.create(user=self.user, name=f'Tag{i}')
+            for i in range(3)
+        ]
+
+        res = self.client.get(SYNC_URL)
+        token = res.data['token']
+        pages = [res.data]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            pages.append(res.data)
+
+        self.assertEqual(len(pages), 3)
+        for page in pages:
+            self.assertLessEqual(len(page['recipes']), 2)
+            self.assertEqual(page['token'], token)
+        self.assertEqual(
+            [r['id'] for page in pages for r in page['recipes']],
+            [recipe.id for recipe in recipes])
+        self.assertEqual(
+            [t['id'] for page in pages for t in page['tags']],
+            [tag.id for tag in tags])
+
+    def test_invalid_cursor_error(self):
+        for cursor in ['not-a-cursor', 'e30=']:
+            with self.subTest(cursor=cursor):
+                res = self.client.get(SYNC_URL, {'cursor': cursor})
+
+                self.assertEqual(
+                    res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sync_returns_only_changes(self):
+        unchanged = create_recipe(user=self.user, title='Unchanged')
+        changed = create_recipe(user=self.user, title='Changed')
+        deleted = create_recipe(user=self.user, title='Deleted')
+        deleted_id = deleted.id
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        ingredient_id = ingredient.id
+        token = self.client.get(SYNC_URL).data['token']
+
+        changed.title = 'New title'
+        changed.save()
+        deleted.delete()
+        ingredient.delete()
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        res = self.client.get(SYNC_URL, {'since': token})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [r['id'] for r in res.data['recipes']]
+        self.assertEqual(ids, [changed.id])
+        self.assertNotIn(unchanged.id, ids)
+        self.assertEqual([t['id'] for t in res.data['tags']], [tag.id])
+        self.assertEqual(res.data['deleted'], {
+            'recipes': [deleted_id],
+            'tags': [],
+            'ingredients': [ingredient_id],
+        })
+
+    def test_sync_includes_recipe_with_new_tag(self):
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        token = self.client.get(SYNC_URL).data['token']
+
+        tag.recipe_set.add(recipe)
+        res = self.client.get(SYNC_URL, {'since': token})
+
+        self.assertEqual([r['id'] for r in res.data['recipes']], [recipe.id])
+
+    def test_sync_includes_recipe_of_deleted_tag(self):
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+        tag_id = tag.id
+        token = self.client.get(SYNC_URL).data['token']
+
+        tag.delete()
+        res = self.client.get(SYNC_URL, {'since': token})
+
+        self.assertEqual([r['id'] for r in res.data['recipes']], [recipe.id])
+        self.assertEqual(res.data['recipes'][0]['tags'], [])
+        self.assertEqual(res.data['deleted']['tags'], [tag_id])
+
+    @override_settings(SYNC_TOKEN_LAG_SECONDS=60)
+    def test_late_commit_sent_next_sync(self):
+        """Test rows stamped before a token but committed after are sent"""
+        synced = create_recipe(user=self.user, title='Synced')
+        Recipe.objects.filter(id=synced.id).update(
+            updated_at=timezone.now() - timedelta(minutes=5))
+        token = self.client.get(SYNC_URL).data['token']
+
+        # Stamped 30s ago by a transaction that only commits now
+        late = create_recipe(user=self.user, title='Late')
+        Recipe.objects.filter(id=late.id).update(
+            updated_at=timezone.now() - timedelta(seconds=30))
+        res = self.client.get(SYNC_URL, {'since': token})
+
+        self.assertEqual([r['id'] for r in res.data['recipes']], [late.id])
+
+    def test_invalid_token_error(self):
+        for since in [
+                'not-a-token',
+                '2026-13-01T00:00:00Z',
+                '2026-10-17T00:00:00']:
+            with self.subTest(since=since):
+                res = self.client.get(SYNC_URL, {'since': since})
+
+                self.assertEqual(
+                    res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expired_token_error(self):
+        since = timezone.now() - timedelta(days=365)
+        res = self.client.get(SYNC_URL, {'since': since.isoformat()})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -16,6 +16,7 @@ from recipe.serializers import TagSerializer
 
 
 TAGS_URL = reverse('recipe:tag-list')
+TAGS_AUTOCOMPLETE_URL = reverse('recipe:tag-autocomplete')
 
 
 def detail_url(tag_id):
@@ -54,7 +55,35 @@ class PrivateTagsAPITest(TestCase):
         res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
+
+    def test_tags_paginated_by_cursor(self):
+        for name in ['Breakfast', 'Dessert', 'Lunch', 'Vegan']:
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL, {'page_size': 3})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [tag['name'] for tag in res.data['results']],
+            ['Vegan', 'Lunch', 'Dessert'])
+        res = self.client.get(res.data['next'])
+        self.assertEqual(
+            [tag['name'] for tag in res.data['results']],
+            ['Breakfast'])
+        self.assertIsNone(res.data['next'])
+
+    def test_tags_list_not_modified(self):
+        Tag.objects.create(user=self.user, name='Vegan')
+        etag = self.client.get(TAGS_URL)['ETag']
+
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(user=self.user, name='Dessert')
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
 
     def test_tags_limited_to_user(self):
         anotherUser = create_user(email='user2@example.com')
@@ -63,9 +92,9 @@ class PrivateTagsAPITest(TestCase):
         res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], tag.name)
-        self.assertEqual(res.data[0]['id'], tag.id)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], tag.name)
+        self.assertEqual(res.data['results'][0]['id'], tag.id)
 
     def test_update_tag(self):
         tag = Tag.objects.create(user=self.user, name='Meet')
@@ -79,6 +108,30 @@ class PrivateTagsAPITest(TestCase):
         tag.refresh_from_db()
         self.assertEqual(tag.name, payload['name'])
 
+    def test_rename_tag_to_existing_name_rejected(self):
+        Tag.objects.create(user=self.user, name='Vegan')
+        tag = Tag.objects.create(user=self.user, name='Meet')
+        other_user = create_user(email='other@example.com')
+        Tag.objects.create(user=other_user, name='Dessert')
+
+        res = self.client.patch(detail_url(tag.id), {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('name', res.data)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'Meet')
+
+        res = self.client.patch(detail_url(tag.id), {'name': 'Dessert'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_get_tag_detail_not_allowed(self):
+        tag = Tag.objects.create(user=self.user, name='Meet')
+
+        res = self.client.get(detail_url(tag.id))
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
     def test_delete_tag(self):
         tag = Tag.objects.create(user=self.user, name='Meet')
         url = detail_url(tag.id)
@@ -98,12 +151,13 @@ class PrivateTagsAPITest(TestCase):
             user=self.user,
         )
         recipe.tags.add(tag1)
+        tag1.refresh_from_db()
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
         s1 = TagSerializer(tag1)
         s2 = TagSerializer(tag2)
-        self.assertIn(s1.data, res.data)
-        self.assertNotIn(s2.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertNotIn(s2.data, res.data['results'])
 
     def test_filterd_tags_unique(self):
         tag = Tag.objects.create(user=self.user, name='Tag 1')
@@ -124,4 +178,84 @@ class PrivateTagsAPITest(TestCase):
         recipe2.tags.add(tag)
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_autocomplete_ordered_by_usage(self):
+        tag1 = Tag.objects.create(user=self.user, name='Dessert')
+        tag2 = Tag.objects.create(user=self.user, name='Dinner')
+        Tag.objects.create(user=self.user, name='Breakfast')
+        for title in ('Recipe 1', 'Recipe 2'):
+            recipe = Recipe.objects.create(
+                title=title,
+                time_minutes=5,
+                price=Decimal('4.50'),
+                user=self.user,
+            )
+            recipe.tags.add(tag2)
+        recipe.tags.add(tag1)
+
+        res = self.client.get(TAGS_AUTOCOMPLETE_URL, {'q': 'd'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [tag['name'] for tag in res.data], ['Dinner', 'Dessert'])
+
+    def test_autocomplete_matches_prefix_only(self):
+        Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='Not vegan')
+        other = create_user(email='user2@example.com')
+        Tag.objects.create(user=other, name='Vegetarian')
+
+        res = self.client.get(TAGS_AUTOCOMPLETE_URL, {'q': 'VEG'})
+
+        self.assertEqual([tag['name'] for tag in res.data], ['Vegan'])
+
+    def test_autocomplete_without_query(self):
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.get(TAGS_AUTOCOMPLETE_URL)
+
+        self.assertEqual(res.data, [])
+
+    def test_recipe_count_follows_links(self):
+        tag1 = Tag.objects.create(user=self.user, name='Tag 1')
+        tag2 = Tag.objects.create(user=self.user, name='Tag 2')
+        recipes = [
+            Recipe.objects.create(
+                title=f'Recipe {i}',
+                time_minutes=5,
+                price=Decimal('4.50'),
+                user=self.user,
+            )
+            for i in range(3)
+        ]
+        for recipe in recipes:
+            recipe.tags.add(tag1)
+        recipes[0].tags.add(tag2)
+        tag2.recipe_set.add(recipes[1])
+
+        recipes[0].tags.remove(tag1, tag1.id + tag2.id)
+        tag2.recipe_set.clear()
+        recipes[1].delete()
+        # Saving a loaded tag keeps the count
+        tag1.name = 'Renamed'
+        tag1.save()
+
+        tag1.refresh_from_db()
+        tag2.refresh_from_db()
+        self.assertEqual(tag1.recipe_count, 1)
+        self.assertEqual(tag2.recipe_count, 0)
+
+    def test_tags_list_shows_recipe_count(self):
+        tag = Tag.objects.create(user=self.user, name='Tag 1')
+        recipe = Recipe.objects.create(
+            title='Recipe',
+            time_minutes=5,
+            price=Decimal('4.50'),
+            user=self.user,
+        )
+        recipe.tags.add(tag)
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.data['results'][0]['recipe_count'], 1)
@@ -1,4 +1,23 @@
 # Views for the recipe APIs
+import codecs
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import (
+    Count,
+    Exists,
+    F,
+    FloatField,
+    OuterRef,
+)
+from django.db.models.functions import Cast
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from drf_spectacular.utils import (
     extend_schema_view,
     extend_schema,
@@ -9,20 +28,65 @@ from rest_framework import (
     viewsets,
     mixins,
     status,
+    generics,
     )
 
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.utils.urls import replace_query_param
 
+from core.authentication import CachedTokenAuthentication
+from core.jobs import enqueue_image_job
 from core.models import (
     Recipe,
     Tag,
-    Ingredient
+    Ingredient,
+    Tombstone,
     )
 
-from recipe import serializers
+from recipe import backup, serializers
+from recipe.bulk import (
+    bulk_create_recipes,
+    bulk_delete_recipes,
+    bulk_update_recipes,
+)
+from recipe.cache import (
+    CachedResponseMixin,
+    ConditionalGetMixin,
+    ConditionalListMixin,
+)
+from recipe.pagination import (
+    RecipeCursorPagination,
+    RecipeAttrCursorPagination,
+)
+from recipe.search import SEARCH_CONFIG
+from user.serializers import ImageJobSerializer
+
+
+# Allowed ?ordering= values, each ends in the id so keyset pagination
+# has a unique position & walks the matching (user, field, id) index
+ORDERINGS = {
+    'id': ('id',),
+    '-id': ('-id',),
+    'time_minutes': ('time_minutes', 'id'),
+    '-time_minutes': ('-time_minutes', '-id'),
+    'price': ('price', 'id'),
+    '-price': ('-price', '-id'),
+}
+
+AUTOCOMPLETE_SIZE = 10
+
+# What a sync sends, in response order
+SYNC_KINDS = ('recipes', 'tags', 'ingredients')
+
+
+def _parse_decimal(value):
+    value = Decimal(value)
+    if not value.is_finite():
+        raise ValueError(value)
+    return value
 
 
 @extend_schema_view(
@@ -37,36 +101,144 @@ from recipe import serializers
                 'ingredients',
                 OpenApiTypes.STR,
                 description='Comma separated list of ingredient IDs to filter'
-            )
+            ),
+            OpenApiParameter(
+                'search',
+                OpenApiTypes.STR,
+                description='Full-text search over title, description, '
+                            'tags & ingredients, ranked by relevance'
+            ),
+            OpenApiParameter(
+                'max_time',
+                OpenApiTypes.INT,
+                description='Only recipes taking at most this many minutes'
+            ),
+            OpenApiParameter(
+                'min_price',
+                OpenApiTypes.DECIMAL,
+                description='Only recipes costing at least this much'
+            ),
+            OpenApiParameter(
+                'max_price',
+                OpenApiTypes.DECIMAL,
+                description='Only recipes costing at most this much'
+            ),
+            OpenApiParameter(
+                'ordering',
+                OpenApiTypes.STR,
+                enum=list(ORDERINGS),
+                description='Sort order, newest first by default or by '
+                            'relevance when searching'
+            ),
+            OpenApiParameter(
+                'match',
+                OpenApiTypes.STR,
+                enum=['any', 'all'],
+                description='Match recipes with any (default) or all of '
+                            'the given tags/ingredients'
+            ),
         ]
     )
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+        ConditionalGetMixin,
+        CachedResponseMixin,
+        viewsets.ModelViewSet):
     # View for manage recipe APIs
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeCursorPagination
 
     def _prams_to_ints(self, qs):
         return [int(str_id) for str_id in qs.split(',')]
 
+    def _filter_by_related(self, queryset, through, related_id, ids,
+                           match_all):
+        # Filter on the through table with a subquery, so no DISTINCT
+        # over the joined recipe rows is needed
+        links = through.objects.filter(**{f'{related_id}__in': ids})
+        if match_all:
+            matched = links.values('recipe_id').annotate(
+                matches=Count(related_id),
+            ).filter(matches=len(set(ids))).values('recipe_id')
+            return queryset.filter(id__in=matched)
+
+        return queryset.filter(Exists(links.filter(recipe_id=OuterRef('pk'))))
+
+    def _param(self, name, parse):
+        value = self.request.query_params.get(name)
+        if value is None:
+            return None
+        try:
+            return parse(value)
+        except (ValueError, InvalidOperation):
+            raise ValidationError({name: 'Enter a valid number.'})
+
     def get_queryset(self):
         # Retrieve recipes for authenticated user
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
+        match_all = self.request.query_params.get('match') == 'all'
+        search = self.request.query_params.get('search')
         queryset = self.queryset
 
         if tags:
             tag_ids = self._prams_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = self._filter_by_related(
+                queryset, Recipe.tags.through, 'tag_id', tag_ids, match_all)
         if ingredients:
             ingredient_ids = self._prams_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+            queryset = self._filter_by_related(
+                queryset,
+                Recipe.ingredients.through,
+                'ingredient_id',
+                ingredient_ids,
+                match_all)
 
-        return queryset.filter(
+        max_time = self._param('max_time', int)
+        min_price = self._param('min_price', _parse_decimal)
+        max_price = self._param('max_price', _parse_decimal)
+        if max_time is not None:
+            queryset = queryset.filter(time_minutes__lte=max_time)
+        if min_price is not None:
+            queryset = queryset.filter(price__gte=min_price)
+        if max_price is not None:
+            queryset = queryset.filter(price__lte=max_price)
+
+        if search:
+            query = SearchQuery(
+                search,
+                config=SEARCH_CONFIG,
+                search_type='websearch')
+            # ts_rank is a float4, compared as float8 against the cursor.
+            # As a float8 the rank round-trips through the cursor exactly.
+            queryset = queryset.filter(search_vector=query).annotate(
+                rank=Cast(SearchRank(F('search_vector'), query), FloatField()))
+
+        queryset = queryset.filter(
             user=self.request.user
-        ).order_by('-id').distinct()
+        ).order_by(*self.get_ordering())
+
+        if self.action in ('list', 'retrieve'):
+            # Load nested tags & ingredients in one query each
+            queryset = queryset.prefetch_related('tags', 'ingredients')
+
+        return queryset
+
+    def get_ordering(self):
+        # Also used by the paginator. Best matches first when searching
+        # without an explicit ordering.
+        ordering = self.request.query_params.get('ordering')
+        if ordering:
+            if ordering not in ORDERINGS:
+                raise ValidationError({
+                    'ordering': f'Choose one of {", ".join(ORDERINGS)}.'})
+            return ORDERINGS[ordering]
+        if self.request.query_params.get('search'):
+            return ('-rank', '-id')
+        return ('-id',)
 
     def get_serializer_class(self):
         if self.action == 'list':
@@ -86,11 +258,212 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            # Processed by the image worker, clients poll the status URL
+            job = enqueue_image_job(
+                request.user,
+                recipe,
+                serializer.validated_data['image'])
+            job_serializer = ImageJobSerializer(
+                job,
+                context=self.get_serializer_context())
+            return Response(
+                job_serializer.data,
+                status=status.HTTP_202_ACCEPTED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def _bulk_items(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError(
+                {'non_field_errors': ['Expected a list of items.']})
+        if len(items) > settings.RECIPE_BULK_MAX_ITEMS:
+            raise ValidationError({'non_field_errors': [
+                f'At most {settings.RECIPE_BULK_MAX_ITEMS} items per request.'
+            ]})
+        return items
+
+    def _bulk_ids(self, items, results):
+        # Recipe IDs of the items, with errors for the malformed ones
+        ids = {}
+        seen = set()
+        for index, item in enumerate(items):
+            recipe_id = item.get('id') if isinstance(item, dict) else item
+            if not isinstance(recipe_id, int) or isinstance(recipe_id, bool):
+                error = 'A valid integer is required.'
+            elif recipe_id in seen:
+                error = 'Duplicate id.'
+            else:
+                ids[index] = recipe_id
+                seen.add(recipe_id)
+                continue
+            results[index] = {
+                'status': status.HTTP_400_BAD_REQUEST,
+                'errors': {'id': [error]},
+            }
+        found = Recipe.objects.filter(
+            user=self.request.user,
+            pk__in=ids.values(),
+        ).in_bulk()
+        for index, recipe_id in ids.items():
+            if recipe_id not in found:
+                results[index] = {
+                    'status': status.HTTP_404_NOT_FOUND,
+                    'errors': {'detail': 'Not found.'},
+                }
+        return {
+            index: found[recipe_id] for index, recipe_id in ids.items()
+            if recipe_id in found
+        }
+
+    def _bulk_response(self, results, valid, atomic, write, success):
+        # Write the valid items unless any item failed in atomic mode
+        if atomic and any(results):
+            for index, _ in valid:
+                results[index] = {
+                    'status': status.HTTP_424_FAILED_DEPENDENCY,
+                    'errors': {'detail': 'Not applied, other items failed.'},
+                }
+            return Response(
+                {'results': results},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        written = write([value for _, value in valid]) if valid else []
+        for (index, _), recipe in zip(valid, written):
+            results[index] = {
+                'status': success,
+                'id': getattr(recipe, 'pk', recipe),
+            }
+        if any(result['status'] != success for result in results):
+            return Response(
+                {'results': results},
+                status=status.HTTP_207_MULTI_STATUS)
+        return Response(
+            {'results': results},
+            status=status.HTTP_201_CREATED
+            if success == status.HTTP_201_CREATED else status.HTTP_200_OK)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'mode',
+                OpenApiTypes.STR,
+                enum=['atomic', 'best_effort'],
+                description='Apply nothing if any item fails (default) '
+                            'or every valid item'
+            ),
+        ],
+        request=serializers.RecipeDetailSerializer(many=True),
+        responses=serializers.BulkResultsSerializer,
+    )
+    @action(methods=['POST', 'PATCH', 'DELETE'], detail=False)
+    def bulk(self, request):
+        # Create (POST), partially update (PATCH, items carry an id) or
+        # delete (DELETE, a list of IDs) many recipes in one transaction
+        mode = request.query_params.get('mode', 'atomic')
+        if mode not in ('atomic', 'best_effort'):
+            raise ValidationError(
+                {'mode': 'Choose one of atomic, best_effort.'})
+        atomic = mode == 'atomic'
+        items = self._bulk_items(request)
+        results = [None] * len(items)
+        valid = []
+
+        if request.method == 'DELETE':
+            recipes = self._bulk_ids(items, results)
+            valid = [(index, recipe.pk) for index, recipe in recipes.items()]
+            return self._bulk_response(
+                results,
+                valid,
+                atomic,
+                lambda ids: bulk_delete_recipes(request.user, ids),
+                status.HTTP_204_NO_CONTENT)
+
+        if request.method == 'PATCH':
+            recipes = self._bulk_ids(items, results)
+            for index, recipe in recipes.items():
+                serializer = self.get_serializer(
+                    recipe, data=items[index], partial=True)
+                if serializer.is_valid():
+                    valid.append((index, (recipe, serializer.validated_data)))
+                else:
+                    results[index] = {
+                        'status': status.HTTP_400_BAD_REQUEST,
+                        'errors': serializer.errors,
+                    }
+            return self._bulk_response(
+                results,
+                sorted(valid, key=lambda pair: pair[0]),
+                atomic,
+                lambda pairs: bulk_update_recipes(request.user, pairs),
+                status.HTTP_200_OK)
+
+        for index, item in enumerate(items):
+            serializer = self.get_serializer(data=item)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                results[index] = {
+                    'status': status.HTTP_400_BAD_REQUEST,
+                    'errors': serializer.errors,
+                }
+        return self._bulk_response(
+            results,
+            valid,
+            atomic,
+            lambda items: bulk_create_recipes(request.user, items),
+            status.HTTP_201_CREATED)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'file_format',
+                OpenApiTypes.STR,
+                enum=list(backup.CONTENT_TYPES),
+                description='ndjson (default) or csv'
+            ),
+        ],
+        responses={(200, 'application/x-ndjson'): OpenApiTypes.STR},
+    )
+    @action(methods=['GET'], detail=False)
+    def export(self, request):
+        # Stream every recipe of the user, in the format the import reads
+        file_format = request.query_params.get('file_format', 'ndjson')
+        if file_format not in backup.CONTENT_TYPES:
+            raise ValidationError(
+                {'file_format': 'Choose one of ndjson, csv.'})
+        response = StreamingHttpResponse(
+            backup.export_recipes(request.user, file_format),
+            content_type=backup.CONTENT_TYPES[file_format])
+        response['Content-Disposition'] = \
+            f'attachment; filename="recipes.{file_format}"'
+        return response
+
+    @extend_schema(
+        request={
+            content_type: OpenApiTypes.STR
+            for content_type in backup.CONTENT_TYPES.values()
+        },
+        responses=serializers.ImportResultSerializer,
+    )
+    @action(
+        methods=['POST'],
+        detail=False,
+        url_path='import',
+        url_name='import',
+        parser_classes=[])
+    def import_recipes(self, request):
+        # Read the body line by line rather than through request.data,
+        # text/csv is parsed as CSV & anything else as NDJSON
+        content_type = request.content_type.split(';')[0].strip()
+        file_format = 'csv' if content_type == 'text/csv' else 'ndjson'
+        stream = request.stream or []
+        result = backup.import_recipes(
+            request.user,
+            codecs.iterdecode(stream, 'utf-8'),
+            file_format)
+        return Response(result)
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -105,12 +478,14 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
 )
 class BaseRecipeAttrViewSet(
+        ConditionalListMixin,
         mixins.DestroyModelMixin,
         mixins.UpdateModelMixin,
         mixins.ListModelMixin,
         viewsets.GenericViewSet):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeAttrCursorPagination
 
     def get_queryset(self):
         assigned_only = bool(
@@ -118,10 +493,34 @@ class BaseRecipeAttrViewSet(
         )
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            queryset = queryset.filter(recipe_count__gt=0)
         return queryset.filter(
             user=self.request.user
-            ).order_by('-name').distinct()
+            ).order_by('-name')
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'q',
+                OpenApiTypes.STR,
+                description='Start of the name, case insensitive'
+            ),
+        ]
+    )
+    @action(methods=['GET'], detail=False, pagination_class=None)
+    def autocomplete(self, request):
+        # Most used names starting with ?q=, found through the trigram
+        # index on (user, UPPER(name))
+        prefix = request.query_params.get('q', '').strip()
+        if not prefix:
+            return Response([])
+
+        queryset = self.queryset.filter(
+            user=request.user,
+            name__istartswith=prefix,
+        ).order_by('-recipe_count', 'name')[:AUTOCOMPLETE_SIZE]
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
@@ -134,3 +533,134 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
 
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter(
+            'since',
+            OpenApiTypes.STR,
+            description=(
+                'Token from the previous sync, omit for a full sync. '
+                'Changes close to the token are sent again, apply them '
+                'by id.'
+            )
+        ),
+        OpenApiParameter(
+            'cursor',
+            OpenApiTypes.STR,
+            description=(
+                'Continues a full sync, follow next until it is null. '
+                'Every page carries the same token.'
+            )
+        ),
+    ]
+)
+class SyncView(generics.GenericAPIView):
+    # Return recipes, tags & ingredients changed since a sync token
+    serializer_class = serializers.SyncSerializer
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def _parse_since(self):
+        since = self.request.query_params.get('since')
+        if not since:
+            return None
+        try:
+            since = parse_datetime(since)
+        except ValueError:
+            # Well formed but impossible, e.g. month 13
+            since = None
+        # Tokens carry their offset, a naive time is ambiguous
+        if since is None or timezone.is_naive(since):
+            raise ValidationError({'since': 'Invalid sync token.'})
+        retention = timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+        if since < timezone.now() - retention:
+            # Deletions this old may have been pruned
+            raise ValidationError(
+                {'since': 'Sync token expired, do a full sync.'})
+        return since
+
+    def _parse_cursor(self):
+        # Continuation of a full sync: its token & the last id sent of
+        # each kind
+        cursor = self.request.query_params.get('cursor')
+        if not cursor:
+            return None
+        try:
+            values = json.loads(urlsafe_b64decode(cursor.encode()))
+            token = parse_datetime(values['token'])
+            last_ids = {kind: int(values[kind]) for kind in SYNC_KINDS}
+        except (ValueError, TypeError, KeyError):
+            token = None
+        if token is None or timezone.is_naive(token):
+            raise ValidationError({'cursor': 'Invalid sync cursor.'})
+        return token, last_ids
+
+    def _next_url(self, token, last_ids):
+        values = {'token': token, **last_ids}
+        cursor = urlsafe_b64encode(json.dumps(values).encode()).decode()
+        return replace_query_param(
+            self.request.build_absolute_uri(), 'cursor', cursor)
+
+    def get(self, request):
+        since = self._parse_since()
+        cursor = self._parse_cursor()
+        if since is not None and cursor is not None:
+            raise ValidationError(
+                {'cursor': 'Only a full sync is sent in pages.'})
+
+        if cursor is not None:
+            token, last_ids = cursor
+        else:
+            # Rows are stamped before their transaction commits, so a
+            # write committing after this read may hold older stamps. The
+            # token lags the clock by more than any write transaction
+            # takes & everything newer is sent again next time.
+            token = timezone.now() - timedelta(
+                seconds=settings.SYNC_TOKEN_LAG_SECONDS)
+            last_ids = dict.fromkeys(SYNC_KINDS, 0)
+        token = token.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        user = request.user
+
+        changes = {
+            'recipes': Recipe.objects.filter(user=user).prefetch_related(
+                'tags', 'ingredients'),
+            'tags': Tag.objects.filter(user=user),
+            'ingredients': Ingredient.objects.filter(user=user),
+        }
+        deleted = {kind: [] for kind in SYNC_KINDS}
+        next_url = None
+        if since is not None:
+            for kind in SYNC_KINDS:
+                changes[kind] = changes[kind].filter(
+                    updated_at__gt=since).order_by('id')
+            tombstones = Tombstone.objects.filter(
+                user=user, deleted_at__gt=since)
+            for model, object_id in tombstones.values_list(
+                    'model', 'object_id'):
+                deleted[f'{model}s'].append(object_id)
+        else:
+            # A full sync has nothing to delete & is sent in id pages of
+            # each kind, so no response holds all of a user's data
+            page_size = settings.SYNC_PAGE_SIZE
+            has_more = False
+            for kind in SYNC_KINDS:
+                rows = list(changes[kind].filter(
+                    id__gt=last_ids[kind]).order_by('id')[:page_size + 1])
+                if len(rows) > page_size:
+                    has_more = True
+                    rows = rows[:page_size]
+                if rows:
+                    last_ids[kind] = rows[-1].id
+                changes[kind] = rows
+            if has_more:
+                next_url = self._next_url(token, last_ids)
+
+        serializer = self.get_serializer({
+            **changes,
+            'deleted': deleted,
+            'token': token,
+            'next': next_url,
+        })
+        return Response(serializer.data)
@@ -3,10 +3,15 @@ from django.contrib.auth import (
     get_user_model,
     authenticate
     )
+from django.conf import settings
+from django.urls import reverse
 # from django.utils.translation import gettext as _
 
 from rest_framework import serializers
 
+from core.images import ImageUploadMixin
+from core.models import ChunkedUpload, ImageJob, Recipe
+
 
 class UserSerializer(serializers.ModelSerializer):
     # Serializer for the user object
@@ -58,10 +63,76 @@ class AuthTokenSerializer(serializers.Serializer):
         return attrs
 
 
-class UserImageSerializer(serializers.ModelSerializer):
+class UserImageSerializer(ImageUploadMixin, serializers.ModelSerializer):
 
     class Meta:
         model = get_user_model()
         fields = ['email', 'image']
         read_only_fields = ['email']
         extra_kwargs = {'image': {'required': 'True'}}
+
+
+class ImageJobSerializer(serializers.ModelSerializer):
+    # Serializer for the status of a queued image upload
+    status_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ImageJob
+        fields = ['id', 'target', 'object_id', 'status', 'error', 'status_url']
+        read_only_fields = fields
+
+    def get_status_url(self, job) -> str:
+        url = reverse('user:image-job', args=[job.id])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+class ChunkedUploadSerializer(serializers.ModelSerializer):
+    # Serializer for starting & following a chunked image upload
+    upload_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ChunkedUpload
+        fields = [
+            'id',
+            'target',
+            'object_id',
+            'size',
+            'offset',
+            'status',
+            'upload_url']
+        read_only_fields = ['id', 'offset', 'status', 'upload_url']
+        extra_kwargs = {'object_id': {'required': False}}
+
+    def validate_size(self, size):
+        # An empty upload could never be finished
+        if size < 1:
+            raise serializers.ValidationError(
+                'Upload must be at least 1 byte.')
+        if size > settings.IMAGE_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'Upload must be at most {settings.IMAGE_UPLOAD_MAX_SIZE} '
+                f'bytes.')
+        return size
+
+    def validate(self, attrs):
+        # Resolve the recipe or user the image is uploaded for
+        user = self.context['request'].user
+        if attrs['target'] == ImageJob.USER:
+            attrs['instance'] = user
+            return attrs
+
+        recipe = Recipe.objects.filter(
+            user=user,
+            pk=attrs.get('object_id'),
+        ).first()
+        if recipe is None:
+            raise serializers.ValidationError(
+                {'object_id': 'Recipe not found.'})
+        attrs['instance'] = recipe
+        return attrs
+
+    def get_upload_url(self, upload) -> str:
+        url = reverse('user:image-upload-detail', args=[upload.id])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
@@ -0,0 +1,205 @@
+# Test for chunked image upload api
+import hashlib
+import io
+from datetime import timedelta
+from decimal import Decimal
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ChunkedUpload, ImageJob, Recipe
+from core.uploads import UploadOffsetError, append_chunk
+
+
+UPLOADS_URL = reverse('user:image-upload-list')
+
+
+def upload_url(upload_id):
+    return reverse('user:image-upload-detail', args=[upload_id])
+
+
+def finalize_url(upload_id):
+    return reverse('user:image-upload-finalize', args=[upload_id])
+
+
+def sample_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (10, 10)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+class ChunkedUploadAPITests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123')
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        for upload in ChunkedUpload.objects.all():
+            upload.file.delete(save=False)
+
+    def start(self, size, **params):
+        payload = {'target': ImageJob.USER, 'size': size}
+        payload.update(params)
+        return self.client.post(UPLOADS_URL, payload)
+
+    def append(self, upload_id, offset, chunk, checksum=None):
+        return self.client.patch(
+            upload_url(upload_id),
+            chunk,
+            content_type='application/octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset),
+            HTTP_X_CHUNK_SHA256=checksum or hashlib.sha256(chunk).hexdigest())
+
+    def test_chunked_upload_queues_job(self):
+        image = sample_image()
+        res = self.start(len(image))
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        upload_id = res.data['id']
+
+        middle = len(image) // 2
+        res = self.append(upload_id, 0, image[:middle])
+        self.assertEqual(res.data['offset'], middle)
+        res = self.append(upload_id, middle, image[middle:])
+        self.assertEqual(res.data['offset'], len(image))
+        res = self.client.post(finalize_url(upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        job = ImageJob.objects.get(id=res.data['id'])
+        self.assertEqual(job.object_id, self.user.id)
+        with job.source.open('rb') as source:
+            self.assertEqual(source.read(), image)
+
+    def test_wrong_offset_conflict(self):
+        upload_id = self.start(10).data['id']
+
+        res = self.append(upload_id, 5, b'12345')
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data['offset'], 0)
+
+    def test_chunk_in_progress_conflict(self):
+        upload_id = self.start(10).data['id']
+        ChunkedUpload.objects.filter(id=upload_id).update(
+            claimed_at=timezone.now())
+
+        res = self.append(upload_id, 0, b'12345')
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(ChunkedUpload.objects.get(id=upload_id).offset, 0)
+
+    def test_stale_claim_taken_over(self):
+        upload_id = self.start(10).data['id']
+        ChunkedUpload.objects.filter(id=upload_id).update(
+            claimed_at=timezone.now() - timedelta(hours=1))
+
+        res = self.append(upload_id, 0, b'12345')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['offset'], 5)
+
+    def test_chunk_read_outside_transaction(self):
+        upload_id = self.start(10).data['id']
+        savepoints = len(connection.savepoint_ids)
+        during_read = []
+
+        class Stream(io.BytesIO):
+            def read(self, size=-1):
+                during_read.append(len(connection.savepoint_ids))
+                return super().read(size)
+
+        chunk = b'12345'
+        upload = append_chunk(
+            self.user, upload_id, 0, Stream(chunk),
+            hashlib.sha256(chunk).hexdigest())
+
+        self.assertEqual(upload.offset, 5)
+        self.assertEqual(set(during_read), {savepoints})
+        self.assertIsNone(ChunkedUpload.objects.get(id=upload_id).claimed_at)
+
+    def test_chunk_of_lost_claim_not_committed(self):
+        upload_id = self.start(10).data['id']
+
+        class Stream(io.BytesIO):
+            def read(self, size=-1):
+                # Another request took the offset over meanwhile
+                ChunkedUpload.objects.filter(id=upload_id).update(
+                    claimed_at=timezone.now() + timedelta(seconds=1))
+                return super().read(size)
+
+        chunk = b'12345'
+        with self.assertRaises(UploadOffsetError):
+            append_chunk(
+                self.user, upload_id, 0, Stream(chunk),
+                hashlib.sha256(chunk).hexdigest())
+
+        upload = ChunkedUpload.objects.get(id=upload_id)
+        self.assertEqual(upload.offset, 0)
+        self.assertEqual(upload.file.size, 0)
+
+    def test_bad_checksum_chunk_discarded(self):
+        upload_id = self.start(10).data['id']
+
+        res = self.append(upload_id, 0, b'12345', checksum='0' * 64)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        upload = ChunkedUpload.objects.get(id=upload_id)
+        self.assertEqual(upload.offset, 0)
+        self.assertEqual(upload.file.size, 0)
+        self.assertIsNone(upload.claimed_at)
+
+    def test_chunk_over_declared_size_rejected(self):
+        upload_id = self.start(4).data['id']
+
+        res = self.append(upload_id, 0, b'12345')
+
+        self.assertEqual(
+            res.status_code,
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=100)
+    def test_upload_over_max_size_rejected(self):
+        res = self.start(101)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_empty_upload_rejected(self):
+        for size in [0, -1]:
+            with self.subTest(size=size):
+                res = self.start(size)
+
+                self.assertEqual(
+                    res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_finalize_incomplete_upload_error(self):
+        upload_id = self.start(10).data['id']
+        self.append(upload_id, 0, b'12345')
+
+        res = self.client.post(finalize_url(upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_recipe_rejected(self):
+        other_user = get_user_model().objects.create_user(
+            email='other@example.com',
+            password='testpass123')
+        recipe = Recipe.objects.create(
+            user=other_user,
+            title='Recipe',
+            time_minutes=5,
+            price=Decimal('4.50'))
+
+        res = self.start(10, target=ImageJob.RECIPE, object_id=recipe.id)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -5,9 +5,15 @@ from django.urls import reverse
 from PIL import Image
 from rest_framework.test import APIClient
 from rest_framework import status
+from io import StringIO
 import tempfile
 import os
 
+from django.core.management import call_command
+
+from core.images import delete_variants
+from core.models import ImageJob
+
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
 ME_URL = reverse('user:me')
@@ -163,6 +169,8 @@ class ImageUploadTest(TestCase):
         self.client.force_authenticate(self.user)
 
     def tearDown(self):
+        self.user.refresh_from_db()
+        delete_variants(self.user.image)
         self.user.image.delete()
 
     def test_upload_image(self):
@@ -173,11 +181,30 @@ class ImageUploadTest(TestCase):
             image_file.seek(0)
             payload = {'image': image_file}
             res = self.client.post(url, payload, format='multipart')
-            self.user.refresh_from_db()
 
-            self.assertEqual(res.status_code, status.HTTP_200_OK)
-            self.assertIn('image', res.data)
-            self.assertTrue(os.path.exists(self.user.image.path))
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['status'], ImageJob.PENDING)
+
+        call_command('run_image_worker', '--once', stdout=StringIO())
+        self.user.refresh_from_db()
+
+        self.assertTrue(os.path.exists(self.user.image.path))
+        res = self.client.get(res.data['status_url'])
+        self.assertEqual(res.data['status'], ImageJob.DONE)
+
+    def test_image_job_limited_to_user(self):
+        other_user = create_user(
+            email='other@example.com',
+            password='testpass123')
+        job = ImageJob.objects.create(
+            user=other_user,
+            target=ImageJob.USER,
+            object_id=other_user.id,
+            source='uploads/pending/missing.jpg')
+
+        res = self.client.get(reverse('user:image-job', args=[job.id]))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
 
     def test_upload_image_bad_request(self):
         url = IMAGE_UPLOAD_URL
@@ -14,4 +14,23 @@ urlpatterns = [
         'user-upload-image/',
         views.UserImageView.as_view({'post': 'upload_image'}),
         name='user-upload-image'),
+    path(
+        'image-jobs/<int:pk>/',
+        views.ImageJobView.as_view(),
+        name='image-job'),
+    path(
+        'image-uploads/',
+        views.ChunkedUploadViewSet.as_view({'post': 'create'}),
+        name='image-upload-list'),
+    path(
+        'image-uploads/<int:pk>/',
+        views.ChunkedUploadViewSet.as_view({
+            'get': 'retrieve',
+            'patch': 'append',
+        }),
+        name='image-upload-detail'),
+    path(
+        'image-uploads/<int:pk>/finalize/',
+        views.ChunkedUploadViewSet.as_view({'post': 'finalize'}),
+        name='image-upload-finalize'),
 ]
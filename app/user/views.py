@@ -1,7 +1,9 @@
 # Views for user api
+import io
+
 from rest_framework import (
     generics,
-    authentication,
+    mixins,
     status,
     viewsets,
     permissions)
@@ -9,11 +11,24 @@ from rest_framework.decorators import action
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
 from rest_framework.response import Response
-from core.models import User
+from core.authentication import CachedTokenAuthentication
+from core.jobs import enqueue_image_job
+from core.models import ChunkedUpload, ImageJob, User
+from core.uploads import (
+    UploadError,
+    UploadInProgress,
+    UploadOffsetError,
+    UploadTooLarge,
+    append_chunk,
+    finish_upload,
+    start_upload,
+    )
 from user.serializers import (
     UserSerializer,
     AuthTokenSerializer,
-    UserImageSerializer
+    UserImageSerializer,
+    ImageJobSerializer,
+    ChunkedUploadSerializer,
     )
 
 
@@ -31,7 +46,7 @@ class CreateTokenView(ObtainAuthToken):
 class ManageUserView(generics.RetrieveUpdateAPIView):
     # Manage the authenticated user
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
@@ -41,7 +56,7 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
 
 class UserImageView(viewsets.GenericViewSet):
     serializer_class = UserImageSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     @action(methods=['POST'],
@@ -52,7 +67,98 @@ class UserImageView(viewsets.GenericViewSet):
         serializer = self.serializer_class(user, data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            # Processed by the image worker, clients poll the status URL
+            job = enqueue_image_job(
+                request.user,
+                user,
+                serializer.validated_data['image'])
+            job_serializer = ImageJobSerializer(
+                job,
+                context={'request': request})
+            return Response(
+                job_serializer.data,
+                status=status.HTTP_202_ACCEPTED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ImageJobView(generics.RetrieveAPIView):
+    # Status of a queued image upload of the authenticated user
+    serializer_class = ImageJobSerializer
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return ImageJob.objects.filter(user=self.request.user)
+
+
+class ChunkedUploadViewSet(
+        mixins.CreateModelMixin,
+        mixins.RetrieveModelMixin,
+        viewsets.GenericViewSet):
+    # Resumable image upload: create, append chunks, then finalize
+    serializer_class = ChunkedUploadSerializer
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return ChunkedUpload.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        data = serializer.validated_data
+        serializer.instance = start_upload(
+            self.request.user,
+            data['instance'],
+            data['size'])
+
+    def append(self, request, pk=None):
+        # Raw chunk body with its offset & SHA-256 in the headers
+        offset = request.headers.get('Upload-Offset', '')
+        checksum = request.headers.get('X-Chunk-SHA256')
+        if not offset.isdigit() or not checksum:
+            return Response(
+                {'detail': 'Upload-Offset & X-Chunk-SHA256 are required.'},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            upload = append_chunk(
+                request.user,
+                pk,
+                int(offset),
+                request.stream or io.BytesIO(),
+                checksum)
+        except ChunkedUpload.DoesNotExist:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        except UploadOffsetError as exc:
+            return Response(
+                {'detail': str(exc), 'offset': exc.offset},
+                status=status.HTTP_409_CONFLICT)
+        except UploadInProgress as exc:
+            return Response(
+                {'detail': str(exc)},
+                status=status.HTTP_409_CONFLICT)
+        except UploadTooLarge as exc:
+            return Response(
+                {'detail': str(exc)},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        except UploadError as exc:
+            return Response(
+                {'detail': str(exc)},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(self.get_serializer(upload).data)
+
+    def finalize(self, request, pk=None):
+        try:
+            job = finish_upload(request.user, pk)
+        except ChunkedUpload.DoesNotExist:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        except UploadError as exc:
+            return Response(
+                {'detail': str(exc)},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        job_serializer = ImageJobSerializer(
+            job,
+            context=self.get_serializer_context())
+        return Response(job_serializer.data, status=status.HTTP_202_ACCEPTED)
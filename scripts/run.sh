@@ -0,0 +1,14 @@
+#!/bin/sh
+
+set -e
+
+# Fails on a per process cache, workers must share one
+python manage.py check --deploy --fail-level ERROR
+python manage.py wait_for_db
+python manage.py collectstatic --noinput
+python manage.py migrate
+# Skipped when the code behind the schema is unchanged
+python manage.py generate_schema
+
+# Workers, threads & SERVER_MODE (wsgi or asgi) come from gunicorn.conf.py
+exec gunicorn